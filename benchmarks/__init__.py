@@ -0,0 +1,40 @@
+"""
+Micro-benchmarks for reportcraft. Run from the repository root, e.g.
+
+    python -m benchmarks.parsers
+"""
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'demo.settings')
+django.setup()
+
+
+def timeit(func, repeat: int = 1) -> float:
+    """
+    Run a function repeatedly and return the best wall-clock duration in seconds
+    :param func: the function to run
+    :param repeat: the number of times to repeat
+    """
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def report(title: str, rows: list[tuple], headers: tuple):
+    """
+    Print a table of benchmark results
+    :param title: the title of the table
+    :param rows: list of row tuples
+    :param headers: column headers
+    """
+    widths = [max(len(str(v)) for v in column) for column in zip(headers, *rows)]
+    print(f'\n{title}')
+    print('  '.join(f'{h:>{w}}' for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(f'{v:>{w}}' for v, w in zip(row, widths)))
@@ -0,0 +1,58 @@
+"""
+Generating cache keys for cached model methods, comparing the previous YAML + MD5 keys against canonical
+blake2b keys, for the typical arguments of DataSource.get_data.
+
+    python -m benchmarks.cache_keys
+"""
+import hashlib
+
+import yaml
+from django.db.models import Q
+
+from benchmarks import timeit, report
+
+from reportcraft import utils
+
+CALLS = 10_000
+
+
+def legacy_cache_key(method: str, args: tuple, kwargs: dict) -> str:
+    """
+    The previous implementation of the keys of cached_model_method
+    """
+    key_data = {'id': 1, 'class': 'DataSource', 'method': method, 'args': args, 'kwargs': kwargs}
+    key_string = yaml.dump(key_data, sort_keys=True)
+    return f"cache:{hashlib.md5(key_string.encode()).hexdigest()}"
+
+
+CASES = {
+    'no arguments': {},
+    'filters': {'filters': {'year': '2024', 'type': 'user', 'institution': '12'}},
+    'filters + select': {
+        'filters': {'year': '2024', 'type': 'user'},
+        'select': Q(type__in=['user', 'admin']) & (Q(age__gte=30) | Q(gender='female')) & ~Q(last_name=''),
+        'order_by': ['-age', 'last_name'],
+        'limit': 20,
+    },
+}
+
+
+def main():
+    rows = []
+    for name, kwargs in CASES.items():
+        legacy = timeit(lambda: [legacy_cache_key('get_data', (), kwargs) for i in range(CALLS)], repeat=3)
+        canonical = timeit(
+            lambda: [utils.make_cache_key('DataSource', 1, 'get_data', 'version', (), kwargs) for i in range(CALLS)],
+            repeat=3
+        )
+        rows.append((
+            name, f'{legacy / CALLS * 1e6:.1f}', f'{canonical / CALLS * 1e6:.1f}', f'{legacy / canonical:.1f}x'
+        ))
+    report(
+        'cache key generation (microseconds per key)', rows,
+        headers=('arguments', 'yaml + md5', 'canonical', 'speed-up')
+    )
+
+
+if __name__ == '__main__':
+    main()
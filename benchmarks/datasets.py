@@ -0,0 +1,76 @@
+"""
+CPU time and peak memory of preparing a bar chart with two value series, sorted by a value and limited, comparing
+the list-of-dicts pipeline (prepare_data + per-row expansion) against the columnar Dataset.
+
+    python -m benchmarks.datasets
+"""
+import heapq
+import random
+import tracemalloc
+
+from benchmarks import timeit, report
+
+from reportcraft.datasets import Dataset
+from reportcraft.utils import prepare_data
+
+SIZES = [10_000, 100_000, 500_000]
+NAMES = ['category', 'count', 'total', 'year', 'notes']
+LABELS = {'category': 'Category', 'count': 'Number of Items', 'total': 'Total Amount', 'year': 'Year'}
+VALUES = ['count', 'total']
+SELECT = ['category', 'count', 'total', 'year']
+
+
+def make_rows(size: int) -> list[tuple]:
+    rng = random.Random(size)
+    return [
+        (f'Category {rng.randint(0, 50)}', rng.randint(0, 1000), rng.random() * 1000, rng.randint(2000, 2025), '')
+        for i in range(size)
+    ]
+
+
+def dict_pipeline(rows: list[tuple], limit: int = None) -> list[dict]:
+    data = [dict(zip(NAMES, row)) for row in rows]                          # QuerySet.values()
+    if limit:
+        data = heapq.nlargest(limit, data, key=lambda x: x.get('total', 0))
+    else:
+        data = sorted(data, key=lambda x: x.get('total', 0), reverse=True)
+    data = prepare_data(data, select=SELECT, labels=LABELS)
+    expanded = []
+    value_keys = [LABELS.get(v, v) for v in VALUES]
+    for item in data:
+        for key in value_keys:
+            new_item = {k: v for k, v in item.items() if k not in value_keys}
+            new_item['Value'] = item.get(key, 0)
+            new_item['Variable'] = key
+            expanded.append(new_item)
+    return expanded
+
+
+def dataset_pipeline(rows: list[tuple], limit: int = None) -> list[dict]:
+    dataset = Dataset.from_rows(NAMES, rows, labels=LABELS)                 # QuerySet.values_list()
+    dataset = dataset.sort('total', descending=True).head(limit).select(SELECT)
+    return dataset.melt(VALUES).to_records()
+
+
+def peak_memory(func) -> float:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main():
+    rows = []
+    for size in SIZES:
+        data = make_rows(size)
+        for limit in [None, 20]:
+            for label, func in [('dicts', dict_pipeline), ('dataset', dataset_pipeline)]:
+                duration = timeit(lambda: func(data, limit), repeat=3)
+                memory = peak_memory(lambda: func(data, limit))
+                rows.append((f'{size:,}', limit or 'all', label, f'{duration:.3f}', f'{memory:.1f}'))
+    report('Bar chart preparation', rows, headers=('rows', 'limit', 'pipeline', 'seconds', 'peak MiB'))
+
+
+if __name__ == '__main__':
+    main()
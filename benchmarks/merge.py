@@ -0,0 +1,59 @@
+"""
+Merging the rows of a grouped multi-model source, comparing the previous string-key implementation of merge_data
+against the typed-key hash merge, with and without sorting.
+
+    python -m benchmarks.merge
+"""
+import random
+
+from benchmarks import timeit, report
+
+from reportcraft import utils
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+def legacy_merge_data(data: list[dict], unique: list[str]) -> list[dict]:
+    """
+    The previous implementation of merge_data, keyed and sorted by strings
+    """
+    make_key = lambda item: tuple(str(item.get(k)) for k in unique)
+    raw_data = {key: {} for key in sorted({make_key(item) for item in data})}
+    for item in data:
+        raw_data[make_key(item)].update(item)
+    return list(raw_data.values())
+
+
+def make_rows(size: int) -> list[dict]:
+    """
+    Simulate two models grouped by (year, category), each returning one row per group
+    :param size: total number of rows
+    """
+    rng = random.Random(size)
+    groups = [(year, f'Category {i}') for year in range(size // 200 or 1) for i in range(100)]
+    rng.shuffle(groups)
+    rows = [{'year': year, 'category': category, 'count': rng.randint(0, 100)} for year, category in groups]
+    rows += [{'year': year, 'category': category, 'total': rng.random()} for year, category in groups]
+    return rows
+
+
+def measure(func, size: int) -> float:
+    rows = make_rows(size)
+    return timeit(lambda: func(rows), repeat=1)
+
+
+def main():
+    unique = ['year', 'category']
+    rows = []
+    for size in SIZES:
+        legacy = measure(lambda data: legacy_merge_data(data, unique), size)
+        merged = measure(lambda data: utils.merge_data(data, unique, sort=False), size)
+        natural = measure(lambda data: utils.merge_data(data, unique, sort=True), size)
+        rows.append((
+            f'{size:,}', f'{legacy:.3f}', f'{merged:.3f}', f'{natural:.3f}', f'{legacy / merged:.1f}x'
+        ))
+    report('merge_data (seconds)', rows, headers=('rows', 'legacy', 'hash merge', 'hash merge + sort', 'speed-up'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Wall-clock latency of a multi-model data source against the number of models, comparing sequential execution of
+the per-model queries with the thread pool (REPORTCRAFT_QUERY_WORKERS). A fixed delay is added to every query to
+emulate the network round trip to a database server.
+
+    python -m benchmarks.parallel
+"""
+import time
+
+from benchmarks import timeit, report
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from reportcraft.models import DataSource, DataModel, DataField
+from demo.example.models import Country, Institution, Person, Subject
+
+LATENCY = 0.02
+MODELS = [
+    ('example.Person', 'Mod(Age, 5)'),
+    ('example.Institution', 'Mod(this, 5)'),
+    ('example.Country', 'Mod(this, 5)'),
+    ('example.Subject', 'Mod(this, 5)'),
+]
+
+
+def delay(execute, sql, params, many, context):
+    time.sleep(LATENCY)
+    return execute(sql, params, many, context)
+
+
+def add_latency(sender, connection, **kwargs):
+    connection.execute_wrappers.append(delay)
+
+
+def create_data():
+    country = Country.objects.create(name='Canada', code='CAN')
+    for i in range(20):
+        Subject.objects.create(name=f'Subject {i}', description='')
+        institution = Institution.objects.create(name=f'Institution {i}', city='Saskatoon', country=country)
+        for j in range(10):
+            Person.objects.create(
+                first_name=f'First{j}', last_name=f'Last{i}', gender='male', age=20 + i + j, bio='',
+                institution=institution,
+            )
+
+
+def create_source(num_models: int) -> DataSource:
+    source = DataSource.objects.create(name=f'{num_models} Models', group_by=['bucket'])
+    for i, (model_name, bucket) in enumerate(MODELS[:num_models]):
+        app_label, model = model_name.lower().split('.')
+        data_model = DataModel.objects.create(
+            source=source, name=model_name, model=ContentType.objects.get(app_label=app_label, model=model)
+        )
+        DataField.objects.create(source=source, model=data_model, name='bucket', label='Bucket', expression=bucket)
+        DataField.objects.create(
+            source=source, model=data_model, name=f'count_{i}', label=f'Count {i}', expression='Count(this)'
+        )
+    return source
+
+
+def main():
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        create_data()
+        sources = [create_source(n) for n in range(1, len(MODELS) + 1)]
+        connection_created.connect(add_latency)
+        connection.execute_wrappers.append(delay)
+        rows = []
+        for source in sources:
+            source.get_plan()
+            with override_settings(REPORTCRAFT_QUERY_WORKERS=0):
+                sequential = timeit(source.get_source_data, repeat=5)
+            with override_settings(REPORTCRAFT_QUERY_WORKERS=len(MODELS)):
+                parallel = timeit(source.get_source_data, repeat=5)
+            rows.append((
+                len(source.get_plan().models), f'{sequential * 1000:.1f}', f'{parallel * 1000:.1f}',
+                f'{sequential / parallel:.1f}x'
+            ))
+        report(
+            f'get_source_data() latency with {LATENCY * 1000:.0f} ms per query', rows,
+            headers=('models', 'sequential (ms)', 'parallel (ms)', 'speedup')
+        )
+    finally:
+        connection.execute_wrappers.clear()
+        connection_created.disconnect(add_latency)
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
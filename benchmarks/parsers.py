@@ -0,0 +1,80 @@
+"""
+Parse throughput of expressions and filters, comparing a freshly built parser per call (the previous behaviour)
+against the shared parsers and the LRU cache of parsed results.
+
+    python -m benchmarks.parsers
+"""
+from benchmarks import timeit, report
+
+from reportcraft import utils
+
+EXPRESSIONS = [
+    "Published.Year",
+    "-Count(this)",
+    "Sum(Metrics.Citations) + Avg(Metrics.Mentions)",
+    "Sum(Metrics.Citations - Metrics.Mentions)",
+    "Count(Journal, distinct=True)",
+    "Concat(Journal.Title, ' (', Journal.Issn, ')')",
+    "Avg(Metrics.Citations) / Avg(Metrics.Mentions)",
+]
+
+FILTERS = [
+    "counts = 10",
+    "Name ~has 'chel'",
+    "Citations > 100 and Mentions < 50",
+    "Citations > 100 and (Mentions < 50 or Size > 10)",
+]
+
+ITERATIONS = 200
+
+
+def fresh_expressions():
+    for i in range(ITERATIONS):
+        for text in EXPRESSIONS:
+            utils.ExpressionParser().parse(text)
+
+
+def shared_expressions():
+    for i in range(ITERATIONS):
+        for text in EXPRESSIONS:
+            utils.EXPRESSION_PARSER.parse(text)
+
+
+def cached_expressions():
+    for i in range(ITERATIONS):
+        for text in EXPRESSIONS:
+            utils.parse_expression(text)
+
+
+def fresh_filters():
+    for i in range(ITERATIONS):
+        for text in FILTERS:
+            utils.FilterParser().parse(text)
+
+
+def shared_filters():
+    for i in range(ITERATIONS):
+        for text in FILTERS:
+            utils.FILTER_PARSER.parse(text)
+
+
+def cached_filters():
+    for i in range(ITERATIONS):
+        for text in FILTERS:
+            utils.parse_filters(text)
+
+
+def main():
+    rows = []
+    for name, count, funcs in [
+        ('expressions', ITERATIONS * len(EXPRESSIONS), (fresh_expressions, shared_expressions, cached_expressions)),
+        ('filters', ITERATIONS * len(FILTERS), (fresh_filters, shared_filters, cached_filters)),
+    ]:
+        for label, func in zip(['new parser per call', 'shared parser', 'shared parser + LRU'], funcs):
+            duration = timeit(func, repeat=3)
+            rows.append((name, label, f'{count / duration:,.0f}'))
+    report('Parse throughput', rows, headers=('kind', 'mode', 'parses/s'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Serializing report payloads to JSON, comparing JsonResponse with the Django encoder against the standard library
+and orjson serializers, for reports of entries with decimal averages, dates and repeated strings. The last column
+includes the conversion of entries to the columnar format, which encodes dates and decimals column by column.
+
+    python -m benchmarks.serialization
+"""
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.http import JsonResponse
+
+from benchmarks import timeit, report
+
+from reportcraft import encoders
+from reportcraft.datasets import to_columnar
+
+SIZES = [1_000, 10_000, 100_000]
+ENTRIES = 4
+
+
+def make_report(size: int) -> dict:
+    """
+    Simulate a report payload with several entries of records, rows are split evenly between entries
+    :param size: total number of records
+    """
+    rng = random.Random(size)
+    start = datetime(2024, 1, 1, 8)
+    content = []
+    for i in range(ENTRIES):
+        content.append({
+            'title': f'Entry {i}',
+            'kind': 'bars',
+            'data': [
+                {
+                    'Category': f'Category {rng.randint(0, 20)}',
+                    'Date': (start + timedelta(hours=j)).date(),
+                    'Time': start + timedelta(minutes=j),
+                    'Count': rng.randint(0, 1000),
+                    'Average': Decimal(rng.randint(0, 100000)) / 100,
+                    'Ratio': rng.random(),
+                }
+                for j in range(size // ENTRIES)
+            ],
+        })
+    return {'title': 'Report', 'description': '', 'sections': [{'content': content}]}
+
+
+def columnar(payload: dict) -> dict:
+    """
+    Convert the entries of a report payload to the columnar format
+    """
+    content = [{**entry, 'data': to_columnar(entry['data'])} for entry in payload['sections'][0]['content']]
+    return {**payload, 'sections': [{'content': content}]}
+
+
+def main():
+    rows = []
+    standard = encoders.JSONSerializer()
+    fast = encoders.OrjsonSerializer() if encoders.orjson else None
+    for size in SIZES:
+        payload = make_report(size)
+        legacy = timeit(lambda: JsonResponse(payload, safe=False), repeat=3)
+        plain = timeit(lambda: standard.dumps(payload), repeat=3)
+        row = [f'{size:,}', f'{legacy:.3f}', f'{plain:.3f}']
+        if fast:
+            optimized = timeit(lambda: fast.dumps(payload), repeat=3)
+            encoded = timeit(lambda: fast.dumps(columnar(payload)), repeat=3)
+            row += [f'{optimized:.3f}', f'{legacy / optimized:.1f}x', f'{encoded:.3f}']
+        else:
+            row += ['-', '-', '-']
+        rows.append(tuple(row))
+    report(
+        'report payload serialization (seconds)', rows,
+        headers=('records', 'JsonResponse', 'json', 'orjson', 'speed-up', 'orjson columnar')
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -13,3 +13,5 @@ class ReportsConfig(AppConfig):
             'VIEW': [],
             'EDIT': ['django.contrib.auth.mixins.LoginRequiredMixin'],
         })
+
+        from . import signals  # noqa: F401
@@ -0,0 +1,750 @@
+"""
+Caching of the results of model methods. Results are kept in the shared Django cache together with the time they
+should be refreshed. Stale results are served while a single refresh per key runs in a bounded pool of worker
+threads, and concurrent computations of the same key are coalesced within a process and, through a lock in the
+shared cache, across processes.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import lzma
+import pickle
+import random
+import threading
+import time as clock
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from functools import wraps
+from operator import itemgetter
+from typing import Any, Callable, Iterator
+from uuid import UUID
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, models
+from django.db.models import F, Q
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('reportcraft')
+
+CACHE_TIMEOUT = 86400
+CACHE_DURATION = getattr(settings, 'REPORTCRAFT_CACHE_DURATION', 300)  # seconds before cached results are refreshed
+CACHE_POLICY = getattr(settings, 'REPORTCRAFT_CACHE_POLICY', 'fixed')       # 'fixed' or 'adaptive'
+CACHE_MIN_DURATION = getattr(settings, 'REPORTCRAFT_CACHE_MIN_DURATION', 30)      # bounds of adaptive durations
+CACHE_MAX_DURATION = getattr(settings, 'REPORTCRAFT_CACHE_MAX_DURATION', 3600)
+CACHE_ADAPTIVE_FACTOR = getattr(settings, 'REPORTCRAFT_CACHE_ADAPTIVE_FACTOR', 600)  # seconds cached per second
+COMPUTE_TIME_WEIGHT = 0.3   # weight of the latest compute time in the moving average
+COMPUTE_TIME_KEY = 'reportcraft:compute-time:{}'
+CACHE_JITTER = getattr(settings, 'REPORTCRAFT_CACHE_JITTER', 0.1)      # fraction by which durations are varied
+CACHE_WORKERS = getattr(settings, 'REPORTCRAFT_CACHE_WORKERS', 2)      # threads refreshing stale results
+LOCK_TIMEOUT = getattr(settings, 'REPORTCRAFT_CACHE_LOCK_TIMEOUT', 60)  # seconds before a refresh lock expires
+CACHE_SERIALIZER = getattr(settings, 'REPORTCRAFT_CACHE_SERIALIZER', 'reportcraft.caching.ColumnarSerializer')
+CACHE_COMPRESSION = getattr(settings, 'REPORTCRAFT_CACHE_COMPRESSION', 'zlib')   # 'zlib', 'lzma' or None
+CACHE_COMPRESS_SIZE = getattr(settings, 'REPORTCRAFT_CACHE_COMPRESS_SIZE', 16384)  # bytes before compressing
+CACHE_ITEM_SIZE = getattr(settings, 'REPORTCRAFT_CACHE_ITEM_SIZE', 1000000)  # largest item stored by the backend
+LOCAL_CACHE_SIZE = getattr(settings, 'REPORTCRAFT_LOCAL_CACHE_SIZE', 0)     # bytes held in-process, 0 disables
+LOCAL_CACHE_CHECK = getattr(settings, 'REPORTCRAFT_LOCAL_CACHE_CHECK', 1)   # seconds between version checks
+RECORD_ACCESS = getattr(settings, 'REPORTCRAFT_RECORD_ACCESS', 0)   # filter combinations tracked per report
+ACCESS_KEY = 'reportcraft:access:{}'
+LOCK_WAIT = 10          # seconds to wait for another process computing a missing result
+LOCK_POLL = 0.05        # initial seconds between checks while waiting, doubled up to one second
+
+
+class RenderMemo:
+    """
+    Results memoized while rendering a single report, so that entries sharing a data source and filters fetch
+    the data once. See render_context.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.hits = 0       # number of data fetches saved, see cached_model_method
+        self.misses = 0
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self.values:
+            self.hits += 1
+            return self.values[key]
+        return default
+
+    def set(self, key: Any, value: Any) -> Any:
+        self.misses += 1
+        self.values[key] = value
+        return value
+
+
+_render_memo: ContextVar[RenderMemo | None] = ContextVar('reportcraft_render_memo', default=None)
+
+
+@contextmanager
+def render_context() -> Iterator[RenderMemo]:
+    """
+    Memoize the results of cached model methods and compiled source plans until the context exits, e.g.
+
+        with render_context() as memo:
+            content = [entry.generate() for entry in report.entries.all()]
+        print(memo.hits)
+    """
+    memo = RenderMemo()
+    token = _render_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _render_memo.reset(token)
+
+
+def get_render_memo() -> RenderMemo | None:
+    """
+    Get the memo of the current render context or None outside a render context
+    """
+    return _render_memo.get()
+
+
+def canonical(value: Any) -> Any:
+    """
+    Convert a value to a canonical form built from tuples and primitive values, so that equivalent values have equal
+    canonical forms with a stable repr. Dictionaries and sets are sorted, and Q objects are flattened and their
+    children sorted, e.g. Q(a=1) & (Q(b=2) & Q(c=3)) and Q(c=3) & Q(b=2) & Q(a__exact=1) are equivalent. Empty Q
+    objects are equivalent to None.
+    :param value: the value to convert
+    """
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    elif isinstance(value, Q):
+        children = []
+        for child in value.children:
+            if isinstance(child, Q):
+                child = canonical(child)
+                if child is None:
+                    continue
+                elif not child[2] and (child[1] == value.connector or len(child[3]) == 1):
+                    children.extend(child[3])
+                else:
+                    children.append(child)
+            else:
+                lookup, term = child
+                children.append(('=', lookup.removesuffix('__exact'), canonical(term)))
+        if not children:
+            return None
+        elif len(children) == 1 and not value.negated and children[0][0] == 'Q':
+            return children[0]
+        connector = value.connector if len(children) > 1 else Q.AND
+        return 'Q', connector, value.negated, tuple(sorted(set(children), key=repr))
+    elif isinstance(value, dict):
+        return 'dict', tuple(sorted(((str(key), canonical(item)) for key, item in value.items()), key=repr))
+    elif isinstance(value, (list, tuple)):
+        return tuple(canonical(item) for item in value)
+    elif isinstance(value, (set, frozenset)):
+        return 'set', tuple(sorted((canonical(item) for item in value), key=repr))
+    elif isinstance(value, F):
+        return 'F', value.name
+    elif isinstance(value, models.Model):
+        return 'model', value._meta.label_lower, value.pk
+    elif isinstance(value, (datetime, date, time)):
+        return type(value).__name__, value.isoformat()
+    elif isinstance(value, (Decimal, UUID)):
+        return type(value).__name__, str(value)
+    elif isinstance(value, Enum):
+        return type(value).__name__, canonical(value.value)
+    elif hasattr(value, 'identity'):
+        return type(value).__name__, canonical(value.identity)
+    elif isinstance(value, type):
+        return 'type', value.__module__, value.__qualname__
+    return type(value).__name__, repr(value)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Generate a cache key from values, equivalent values generate the same key, see canonical
+    :param parts: the values to include in the key
+    """
+    digest = hashlib.blake2b(repr(canonical(parts)).encode(), digest_size=16).hexdigest()
+    return f"cache:{digest}"
+
+
+def jittered(duration: float) -> float:
+    """
+    Vary a duration randomly by the fraction set in REPORTCRAFT_CACHE_JITTER, so that results cached together do
+    not all expire together.
+    :param duration: the duration in seconds
+    """
+    return duration * random.uniform(1 - CACHE_JITTER, 1 + CACHE_JITTER)
+
+
+class PackedRecords:
+    """
+    A list of dictionaries sharing the same keys, packed as the keys and a tuple of values per dictionary
+    """
+    __slots__ = ('names', 'rows')
+
+    def __init__(self, names: tuple, rows: list[tuple]):
+        self.names = names
+        self.rows = rows
+
+    @classmethod
+    def pack(cls, value: Any) -> Any:
+        """
+        Pack a list of dictionaries sharing the same keys, other values are returned unchanged
+        :param value: the value to pack
+        """
+        if not (isinstance(value, list) and value and isinstance(value[0], dict) and value[0]):
+            return value
+        keys = value[0].keys()
+        if not all(isinstance(item, dict) and item.keys() == keys for item in value):
+            return value
+        names = tuple(keys)
+        if len(names) == 1:
+            return cls(names, [(item[names[0]],) for item in value])
+        return cls(names, list(map(itemgetter(*names), value)))
+
+    def unpack(self) -> list[dict]:
+        names = self.names
+        return [dict(zip(names, row)) for row in self.rows]
+
+
+class CacheSerializer:
+    """
+    Converts cached values to and from bytes. The serializer used is set by REPORTCRAFT_CACHE_SERIALIZER.
+    """
+
+    def encode(self, value: Any) -> tuple[bytes, int]:
+        """
+        Serialize a value
+        :param value: the value to serialize
+        :return: a tuple of the serialized bytes and their size before compression
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return data, len(data)
+
+    def dumps(self, value: Any) -> bytes:
+        return self.encode(value)[0]
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class ColumnarSerializer(CacheSerializer):
+    """
+    Stores lists of dictionaries sharing the same keys without repeating the keys, see PackedRecords, and
+    compresses payloads above a size threshold. The first byte of the payload identifies the compression.
+    """
+    compressors = {'zlib': (b'z', zlib), 'lzma': (b'x', lzma)}
+
+    def __init__(self, compression: str | None = None, threshold: int = None):
+        """
+        :param compression: 'zlib', 'lzma' or None, defaults to REPORTCRAFT_CACHE_COMPRESSION
+        :param threshold: size in bytes above which payloads are compressed, defaults to
+            REPORTCRAFT_CACHE_COMPRESS_SIZE
+        """
+        self.compression = CACHE_COMPRESSION if compression is None else compression
+        self.threshold = CACHE_COMPRESS_SIZE if threshold is None else threshold
+
+    def encode(self, value: Any) -> tuple[bytes, int]:
+        data, size = super().encode(PackedRecords.pack(value))
+        if self.compression and size > self.threshold:
+            tag, module = self.compressors[self.compression]
+            return tag + module.compress(data), size
+        return b'-' + data, size
+
+    def loads(self, data: bytes) -> Any:
+        tag, body = data[:1], memoryview(data)[1:]
+        for compressed, module in self.compressors.values():
+            if tag == compressed:
+                body = module.decompress(body)
+                break
+        value = super().loads(body)
+        return value.unpack() if isinstance(value, PackedRecords) else value
+
+
+_serializer = None
+
+
+def get_serializer() -> CacheSerializer:
+    """
+    Get the serializer for cached values set by REPORTCRAFT_CACHE_SERIALIZER
+    """
+    global _serializer
+    if _serializer is None:
+        _serializer = import_string(CACHE_SERIALIZER)()
+    return _serializer
+
+
+class CacheStats:
+    """
+    Sizes of the values stored in the shared cache by this process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.chunked = 0
+        self.raw_size = 0
+        self.stored_size = 0
+
+    def record(self, raw_size: int, stored_size: int, chunks: int):
+        with self.lock:
+            self.stored += 1
+            self.chunked += int(chunks > 1)
+            self.raw_size += raw_size
+            self.stored_size += stored_size
+
+    def as_dict(self) -> dict:
+        return {
+            'stored': self.stored,
+            'chunked': self.chunked,
+            'raw_size': self.raw_size,
+            'stored_size': self.stored_size,
+            'ratio': round(self.stored_size / self.raw_size, 3) if self.raw_size else None,
+        }
+
+
+stats = CacheStats()
+
+
+class TierMetrics:
+    """
+    Hits and misses of a cache tier in this process
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'ratio': round(self.hits / total, 3) if total else None}
+
+
+metrics = {'local': TierMetrics(), 'shared': TierMetrics()}
+
+
+def get_metrics() -> dict:
+    """
+    Get the hits and misses of the in-process and shared cache tiers and the sizes of stored values
+    """
+    return {
+        **{tier: tier_metrics.as_dict() for tier, tier_metrics in metrics.items()},
+        'sizes': stats.as_dict(),
+        'local_size': local_cache.size,
+    }
+
+
+class LocalCache:
+    """
+    An in-process cache in front of the shared cache, holding the most recently used values up to a total size.
+    Sizes are those of the serialized values. Values are shared by all threads of the process and must not be
+    modified, as for the results memoized within a render context.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        :param max_size: the total size in bytes of values to hold, the cache is disabled if 0
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.entries: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        """
+        Get a value and the time it should be refreshed, or None if it is not held
+        :param key: the cache key
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, expires: float, value: Any, size: int):
+        """
+        Hold a value, evicting the least recently used values beyond the total size
+        :param key: the cache key
+        :param expires: the time the value should be refreshed
+        :param value: the value
+        :param size: the serialized size of the value in bytes
+        """
+        if size > self.max_size:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+            self.entries[key] = (expires, value, size)
+            self.size += size
+            while self.size > self.max_size:
+                self.size -= self.entries.popitem(last=False)[1][2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+local_cache = LocalCache(LOCAL_CACHE_SIZE)
+
+
+def adaptive_duration(compute_time: float) -> float:
+    """
+    Scale the cache duration of a result with the time it takes to compute, within REPORTCRAFT_CACHE_MIN_DURATION
+    and REPORTCRAFT_CACHE_MAX_DURATION, so that expensive results are refreshed less often than cheap ones.
+    :param compute_time: the average compute time in seconds, REPORTCRAFT_CACHE_DURATION is used if unknown
+    """
+    if not compute_time:
+        return CACHE_DURATION
+    return min(max(compute_time * CACHE_ADAPTIVE_FACTOR, CACHE_MIN_DURATION), CACHE_MAX_DURATION)
+
+
+def ewma(average: float, value: float, weight: float = COMPUTE_TIME_WEIGHT) -> float:
+    """
+    Update an exponentially weighted moving average
+    :param average: the previous average
+    :param value: the new value
+    :param weight: the weight of the new value
+    """
+    return average * (1 - weight) + value * weight
+
+
+def get_compute_time(source_id: int) -> float:
+    """
+    Get the average time in seconds taken to compute the cached results of a data source, 0 if not yet measured
+    :param source_id: the primary key of the data source
+    """
+    return cache.get(COMPUTE_TIME_KEY.format(source_id), 0.0)
+
+
+def record_compute_time(source_id: int, duration: float):
+    """
+    Record the time taken to compute a cached result of a data source, as an exponentially weighted moving average.
+    Concurrent updates may overwrite each other, which only loses a sample.
+    :param source_id: the primary key of the data source
+    :param duration: the compute time in seconds
+    """
+    key = COMPUTE_TIME_KEY.format(source_id)
+    try:
+        average = cache.get(key)
+        cache.set(key, duration if average is None else ewma(average, duration), timeout=None)
+    except Exception as e:
+        logger.warning(f"Cache error: {e}")
+
+
+_refresh_executor = None
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def get_refresh_executor() -> ThreadPoolExecutor:
+    """
+    Get the shared thread pool used to refresh stale results, sized by the REPORTCRAFT_CACHE_WORKERS setting
+    """
+    global _refresh_executor
+    with _inflight_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=max(CACHE_WORKERS, 1), thread_name_prefix='reportcraft-cache'
+            )
+    return _refresh_executor
+
+
+def claim(key: str) -> tuple[Future, bool]:
+    """
+    Claim the computation of a key in this process.
+    :param key: the cache key
+    :return: a tuple of the future for the result and whether the caller claimed it and must resolve the future
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future, False
+        future = _inflight[key] = Future()
+        return future, True
+
+
+def release(key: str, future: Future):
+    """
+    Release a key claimed in this process once its future is resolved
+    """
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def store(key: str, value: Any, duration: float):
+    """
+    Store a value in the shared cache together with the time it should be refreshed. The value is serialized by
+    the configured serializer, and payloads larger than REPORTCRAFT_CACHE_ITEM_SIZE are split into chunks
+    stored under separate keys, with the digest of the payload in the main entry.
+    :param key: the cache key
+    :param value: the value to store
+    :param duration: seconds before the value should be refreshed, varied by jittered
+    """
+    data, raw_size = get_serializer().encode(value)
+    expires = clock.time() + jittered(duration)
+    size = len(data)
+    try:
+        if size > CACHE_ITEM_SIZE:
+            chunks = {
+                f'{key}:{i}': data[offset:offset + CACHE_ITEM_SIZE]
+                for i, offset in enumerate(range(0, size, CACHE_ITEM_SIZE))
+            }
+            cache.set_many(chunks, timeout=CACHE_TIMEOUT)
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            cache.set(key, (expires, digest, len(chunks)), timeout=CACHE_TIMEOUT)
+        else:
+            chunks = {key: data}
+            cache.set(key, (expires, data, 0), timeout=CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Cache error: {e}")
+    else:
+        stats.record(raw_size, size, len(chunks))
+        local_cache.set(key, expires, value, size)
+
+
+def load(key: str) -> tuple[float, Any] | None:
+    """
+    Load a value stored in the shared cache, see store, and hold it in the local cache
+    :param key: the cache key
+    :return: a tuple of the time the value should be refreshed and the value, or None if it is missing, including
+        if any of its chunks are missing or were replaced by a concurrent store
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    expires, data, count = entry
+    if count:
+        chunks = cache.get_many([f'{key}:{i}' for i in range(count)])
+        if len(chunks) < count:
+            return None
+        data = b''.join(chunks[f'{key}:{i}'] for i in range(count))
+        if hashlib.blake2b(data, digest_size=16).digest() != entry[1]:
+            return None
+    value = get_serializer().loads(data)
+    local_cache.set(key, expires, value, len(data))
+    return expires, value
+
+
+def compute(key: str, func: Callable, duration: float, future: Future, stale: Any = None, wait: bool = True) -> Any:
+    """
+    Compute and store the value of a claimed key and resolve its future. Other processes are excluded by a lock in
+    the shared cache. If they hold the lock, a missing value is awaited for a while before computing it anyway,
+    and a stale value is kept without computing it.
+    :param key: the cache key
+    :param func: callable taking no arguments which computes the value
+    :param duration: seconds before the value should be refreshed
+    :param future: the future claimed for the key, see claim
+    :param stale: the stale value being refreshed, if any
+    :param wait: True if the value is missing, False if a stale value is being refreshed
+    """
+    lock_key = f'{key}:lock'
+    try:
+        locked = acquire(lock_key)
+        if not locked and not wait:
+            value = stale
+        elif not locked and (entry := wait_for(key)) is not None:
+            value = entry[1]
+        else:
+            try:
+                value = func()
+                store(key, value, duration)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        release(key, future)
+
+
+def acquire(lock_key: str) -> bool:
+    """
+    Acquire a lock in the shared cache, the lock is taken to be acquired if the cache is unavailable
+    :param lock_key: the cache key of the lock
+    """
+    try:
+        return cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Cache error: {e}")
+        return True
+
+
+def wait_for(key: str) -> tuple | None:
+    """
+    Wait for another process to store the value of a key
+    :param key: the cache key
+    :return: the cache entry or None if it did not appear within LOCK_WAIT seconds
+    """
+    deadline = clock.monotonic() + LOCK_WAIT
+    interval = LOCK_POLL
+    while clock.monotonic() < deadline:
+        clock.sleep(interval)
+        entry = load(key)
+        if entry is not None:
+            return entry
+        interval = min(interval * 2, 1.0)
+    return None
+
+
+def refresh(key: str, func: Callable, duration: float, stale: Any):
+    """
+    Refresh a stale value unless its refresh is already in progress. Within a transaction the value is refreshed
+    immediately, since worker threads use their own connections and would not see uncommitted changes.
+    :param key: the cache key
+    :param func: callable taking no arguments which computes the value
+    :param duration: seconds before the value should be refreshed
+    :param stale: the stale value
+    """
+    future, claimed = claim(key)
+    if not claimed:
+        return
+    if connection.in_atomic_block:
+        compute(key, func, duration, future, stale=stale, wait=False)
+    else:
+        get_refresh_executor().submit(run_refresh, key, func, duration, future, stale)
+
+
+def run_refresh(key: str, func: Callable, duration: float, future: Future, stale: Any):
+    """
+    Refresh a stale value in a worker thread and release the thread's database connections afterwards
+    """
+    try:
+        compute(key, func, duration, future, stale=stale, wait=False)
+    except Exception as e:
+        logger.error(f"Unable to refresh cached value {key}: {e}")
+    finally:
+        connections.close_all()
+
+
+def get_or_compute(key: str, func: Callable, duration: float | Callable[[], float] = None) -> Any:
+    """
+    Get a value from the cache, computing it if it is missing. Values are looked up in the local cache if enabled,
+    then in the shared cache. Stale values are returned immediately and refreshed in the background. Concurrent
+    requests for the same missing value share a single computation.
+    :param key: the cache key
+    :param func: callable taking no arguments which computes the value
+    :param duration: seconds before the value should be refreshed, defaults to REPORTCRAFT_CACHE_DURATION. A callable
+        is only called when the value is computed, so that fresh cached values are served without evaluating it.
+    """
+    if local_cache.max_size:
+        entry = local_cache.get(key)
+        fresh = entry is not None and clock.time() <= entry[0]
+        metrics['local'].record(fresh)
+        if fresh:
+            return entry[1]
+
+    try:
+        entry = load(key)
+    except Exception as e:
+        logger.warning(f"Cache error: {e}")
+        return func()
+
+    metrics['shared'].record(entry is not None)
+    if entry is not None:
+        expires, value = entry
+        if clock.time() > expires:
+            refresh(key, func, resolve_duration(duration), value)
+        return value
+
+    future, claimed = claim(key)
+    if not claimed:
+        return future.result()
+    return compute(key, func, resolve_duration(duration), future)
+
+
+def resolve_duration(duration: float | Callable[[], float] | None) -> float:
+    """
+    Get the cache duration in seconds from a value or callable, see get_or_compute
+    :param duration: seconds, a callable returning them, or None for REPORTCRAFT_CACHE_DURATION
+    """
+    if callable(duration):
+        duration = duration()
+    return CACHE_DURATION if duration is None else duration
+
+
+def cached_model_method(duration: int = None):
+    """
+    Cache the results of a model method, see get_or_compute. Models can customize caching through optional methods:
+    the value of get_cache_version is included in the cache key, so that changing the version invalidates all cached
+    results of the instance, get_cache_duration provides the duration, and record_compute_time receives the time in
+    seconds taken by each computation.
+    :param duration: seconds before a cached result is refreshed in the background, defaults to the value of
+        get_cache_duration or the REPORTCRAFT_CACHE_DURATION setting
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            # Generate a cache key using method name and arguments
+            version = self.get_cache_version() if hasattr(self, 'get_cache_version') else None
+            cache_key = make_cache_key(self.__class__.__name__, self.id, func.__name__, version, args, kwargs)
+
+            memo = get_render_memo()
+            if memo is not None and cache_key in memo.values:
+                return memo.get(cache_key)
+            # evaluated only when the result is computed, see get_or_compute
+            ttl = self.get_cache_duration if duration is None and hasattr(self, 'get_cache_duration') else duration
+
+            def compute_result():
+                start = clock.perf_counter()
+                value = func(self, *args, **kwargs)
+                if hasattr(self, 'record_compute_time'):
+                    self.record_compute_time(clock.perf_counter() - start)
+                return value
+
+            result = get_or_compute(cache_key, compute_result, duration=ttl)
+            return result if memo is None else memo.set(cache_key, result)
+
+        return wrapper
+
+    return decorator
+
+
+def record_access(report: str, filters: dict):
+    """
+    Count a request for a report with a combination of dynamic filters, when REPORTCRAFT_RECORD_ACCESS is set.
+    Counts are kept in the shared cache for at most four times that many combinations per report. When the limit
+    is exceeded, the least requested combinations are dropped. Concurrent updates may overwrite each other, which
+    only loses counts.
+    :param report: the slug of the report
+    :param filters: the dynamic filters of the request
+    """
+    if not RECORD_ACCESS:
+        return
+    key = ACCESS_KEY.format(report)
+    combination = tuple(sorted((str(name), str(value)) for name, value in filters.items()))
+    try:
+        counts = cache.get(key) or {}
+        counts[combination] = counts.get(combination, 0) + 1
+        if len(counts) > RECORD_ACCESS * 4:
+            counts = dict(sorted(counts.items(), key=lambda item: -item[1])[:RECORD_ACCESS * 2])
+        cache.set(key, counts, timeout=None)
+    except Exception as e:
+        logger.warning(f"Cache error: {e}")
+
+
+def get_top_filters(report: str, count: int = None) -> list[dict]:
+    """
+    Get the most requested combinations of dynamic filters of a report, see record_access
+    :param report: the slug of the report
+    :param count: the number of combinations, defaults to REPORTCRAFT_RECORD_ACCESS
+    """
+    counts = cache.get(ACCESS_KEY.format(report)) or {}
+    ranked = sorted(counts.items(), key=lambda item: -item[1])
+    return [dict(combination) for combination, hits in ranked[:count or RECORD_ACCESS]]
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import calendar
+from datetime import date, datetime
+from decimal import Decimal
+from operator import itemgetter
+from typing import Any, Iterable, Sequence
+
+import numpy
+from django.utils import timezone
+
+from .utils import natural_key
+
+COLUMNAR_PARAM = 'layout'
+COLUMNAR_MEDIA_TYPE = 'application/vnd.reportcraft.columnar+json'
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DAY_MS = 86400000
+
+
+def to_array(values: Sequence) -> numpy.ndarray:
+    """
+    Convert a sequence of values to a one-dimensional array. Integers and floats are stored in typed arrays, all
+    other values, including missing values, strings and dates, are stored as Python objects.
+    :param values: the values of a column
+    """
+    size = len(values)
+    kinds = set(map(type, values))
+    if kinds and kinds <= {int}:
+        try:
+            return numpy.fromiter(values, dtype=numpy.int64, count=size)
+        except OverflowError:
+            pass
+    elif kinds and kinds <= {int, float}:
+        return numpy.fromiter(values, dtype=numpy.float64, count=size)
+    return numpy.fromiter(values, dtype=object, count=size)
+
+
+def rank(values: numpy.ndarray) -> numpy.ndarray:
+    """
+    Dense ranks of the values of an object array, equal values have equal ranks. Values of mixed types are ranked
+    in natural order, see utils.natural_key.
+    :param values: the array of values
+    """
+    try:
+        return numpy.unique(values, return_inverse=True)[1]
+    except TypeError:
+        items = values.tolist()
+        positions = {value: i for i, value in enumerate(sorted(set(items), key=natural_key))}
+        return numpy.fromiter((positions[value] for value in items), dtype=numpy.int64, count=len(items))
+
+
+def epoch_ms_column(values: list) -> list:
+    """
+    Convert a column of dates and datetimes to milliseconds since the Unix epoch, see epoch_ms. Dates are converted
+    from their day ordinals, and the current timezone is looked up once for naive datetimes. Missing values are kept.
+    :param values: the dates, datetimes or None values of the column
+    """
+    if not any(isinstance(value, datetime) for value in values):
+        return [None if value is None else (value.toordinal() - EPOCH_ORDINAL) * DAY_MS for value in values]
+    local = timezone.get_current_timezone()
+    return [
+        None if value is None else epoch_ms(
+            value.replace(tzinfo=local) if isinstance(value, datetime) and value.utcoffset() is None else value
+        )
+        for value in values
+    ]
+
+
+def epoch_ms(value: date) -> int:
+    """
+    Convert a date or datetime to milliseconds since the Unix epoch. Dates are taken as midnight UTC and naive
+    datetimes as local times in the current timezone.
+    :param value: the date or datetime to convert
+    """
+    if isinstance(value, datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return round(value.timestamp() * 1000)
+    return calendar.timegm(value.timetuple()) * 1000
+
+
+def encode_column(values: list) -> tuple[dict, list]:
+    """
+    Encode the values of a column for the columnar wire format. Dates are converted to epoch milliseconds, decimals
+    to floats, and strings with many repeated values are dictionary-encoded as indices into a list of categories.
+    :param values: the values of the column
+    :return: a tuple of the column encoding and the encoded values
+    """
+    kinds = {type(value) for value in values if value is not None}
+    if kinds and all(issubclass(kind, date) for kind in kinds):
+        return {'type': 'date'}, epoch_ms_column(values)
+    elif Decimal in kinds and kinds <= {Decimal, int, float}:
+        return {}, [None if value is None else float(value) for value in values]
+    elif kinds == {str}:
+        categories = list(dict.fromkeys(value for value in values if value is not None))
+        if len(categories) <= len(values) // 2:
+            index = {value: i for i, value in enumerate(categories)}
+            return {'type': 'category', 'categories': categories}, [index.get(value) for value in values]
+    return {}, values
+
+
+def to_columnar(records: list[dict]) -> dict:
+    """
+    Convert a list of dictionaries to the columnar wire format: a list of column descriptions and a list of
+    encoded values for each column, see encode_column. Values missing from a record are encoded as null.
+    :param records: the list of dictionaries
+    """
+    names = list(dict.fromkeys(key for record in records for key in record))
+    columns, values = [], []
+    for name in names:
+        encoding, encoded = encode_column([record.get(name) for record in records])
+        columns.append({'name': name, **encoding})
+        values.append(encoded)
+    return {'columns': columns, 'values': values}
+
+
+def is_records(data: Any) -> bool:
+    """
+    Check if entry data can be converted to the columnar wire format, i.e. it is a non-empty list of dictionaries
+    :param data: the data to check
+    """
+    return isinstance(data, list) and bool(data) and all(isinstance(item, dict) for item in data)
+
+
+class Dataset:
+    """
+    A columnar table of data. Each column is a one-dimensional NumPy array and all columns have the same length.
+    Operations return new datasets which share the unchanged columns with the original, rows are only converted
+    to dictionaries by to_records.
+    """
+
+    def __init__(self, columns: dict[str, numpy.ndarray], labels: dict[str, str] = None):
+        """
+        :param columns: dictionary mapping field names to arrays of equal length
+        :param labels: dictionary mapping field names to labels
+        """
+        self.columns = columns
+        self.labels = labels or {}
+
+    @classmethod
+    def from_rows(cls, names: Sequence[str], rows: Iterable[Sequence], labels: dict = None) -> Dataset:
+        """
+        Create a dataset from rows of values, such as those returned by QuerySet.values_list
+        :param names: the field names of the values in each row
+        :param rows: an iterable of row tuples
+        :param labels: dictionary mapping field names to labels
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        return cls({name: to_array(list(map(itemgetter(i), rows))) for i, name in enumerate(names)}, labels=labels)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], labels: dict = None) -> Dataset:
+        """
+        Create a dataset from a list of dictionaries. Values missing from a record are filled with None.
+        :param records: an iterable of dictionaries
+        :param labels: dictionary mapping field names to labels
+        """
+        records = list(records)
+        names = list(dict.fromkeys(key for record in records for key in record))
+        return cls({name: to_array([record.get(name) for record in records]) for name in names}, labels=labels)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        return self.columns[name]
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.columns.keys())
+
+    def select(self, names: Iterable[str]) -> Dataset:
+        """
+        Select a subset of columns, names which are not in the dataset are ignored
+        :param names: the field names to select
+        """
+        return Dataset({name: self.columns[name] for name in dict.fromkeys(names) if name in self.columns}, self.labels)
+
+    def take(self, indices: numpy.ndarray) -> Dataset:
+        """
+        Select rows by position
+        :param indices: an array of row indices or a boolean mask
+        """
+        return Dataset({name: column[indices] for name, column in self.columns.items()}, self.labels)
+
+    def filter(self, name: str, condition) -> Dataset:
+        """
+        Select the rows for which a condition on a column holds
+        :param name: the field name of the column to test
+        :param condition: a function which takes the column array and returns a boolean mask
+        """
+        return self.take(numpy.asarray(condition(self.columns[name]), dtype=bool))
+
+    def head(self, size: int | None) -> Dataset:
+        """
+        Select the first rows of the dataset
+        :param size: the maximum number of rows, all rows are kept if None
+        """
+        return self if size is None else self.take(slice(0, size))
+
+    def argsort(self, name: str, descending: bool = False) -> numpy.ndarray:
+        """
+        Stable ordering of the rows by the values of a column, rows with equal values keep their relative order in
+        both directions.
+        :param name: the field name of the column to sort by
+        :param descending: sort in descending order
+        """
+        column = self.columns[name]
+        if column.dtype == object:
+            column = rank(column)
+        if descending:
+            return len(column) - 1 - numpy.argsort(column[::-1], kind='stable')[::-1]
+        return numpy.argsort(column, kind='stable')
+
+    def sort(self, name: str, descending: bool = False) -> Dataset:
+        """
+        Sort the rows by the values of a column, see argsort
+        :param name: the field name of the column to sort by
+        :param descending: sort in descending order
+        """
+        if name not in self.columns:
+            return self
+        return self.take(self.argsort(name, descending=descending))
+
+    def melt(self, names: list[str], variable: str = 'Variable', value: str = 'Value', default: Any = 0) -> Dataset:
+        """
+        Unpivot columns into rows. Each row is repeated once per melted column, with the label of the column in the
+        variable column and its value in the value column. Other columns are repeated unchanged.
+        :param names: the field names of the columns to melt
+        :param variable: name of the new column holding the labels of the melted columns
+        :param value: name of the new column holding the values of the melted columns
+        :param default: value for melted columns which are not in the dataset
+        """
+        size, count = len(self), len(names)
+        columns = {
+            key: numpy.repeat(column, count) for key, column in self.columns.items() if key not in names
+        }
+        melted = numpy.empty((size, count), dtype=object)
+        for i, name in enumerate(names):
+            melted[:, i] = self.columns[name] if name in self.columns else default
+        columns[value] = melted.ravel()
+        columns[variable] = numpy.tile(numpy.array([self.labels.get(name, name) for name in names], dtype=object), size)
+        return Dataset(columns, self.labels)
+
+    def to_columnar(self, labelled: bool = True) -> dict:
+        """
+        Convert the dataset to the columnar wire format, see to_columnar
+        :param labelled: use the labels of the fields as column names instead of the field names
+        """
+        columns, values = [], []
+        for name, column in self.columns.items():
+            encoding, encoded = encode_column(column.tolist())
+            columns.append({'name': self.labels.get(name, name) if labelled else name, **encoding})
+            values.append(encoded)
+        return {'columns': columns, 'values': values}
+
+    def to_records(self, labelled: bool = True) -> list[dict]:
+        """
+        Convert the dataset to a list of dictionaries with native Python values
+        :param labelled: use the labels of the fields as keys instead of the field names
+        """
+        keys = [self.labels.get(name, name) if labelled else name for name in self.columns]
+        return [dict(zip(keys, row)) for row in zip(*(column.tolist() for column in self.columns.values()))]
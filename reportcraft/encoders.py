@@ -0,0 +1,109 @@
+"""
+Serialization of report and data source payloads to JSON. The serializer is set by REPORTCRAFT_JSON_SERIALIZER and
+defaults to the orjson backend when orjson is installed, and to the standard library otherwise.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+from decimal import Decimal
+from typing import Any
+
+import numpy
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_SERIALIZER = getattr(settings, 'REPORTCRAFT_JSON_SERIALIZER', None)   # full class name, None for automatic
+
+
+class ReportJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder for report payloads. Decimals, such as the results of averages and rounding, are encoded as numbers
+    instead of strings, and NumPy arrays and scalars as lists and numbers.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, Decimal):
+            return float(o)
+        elif isinstance(o, numpy.ndarray):
+            return o.tolist()
+        elif isinstance(o, numpy.generic):
+            return o.item()
+        return super().default(o)
+
+
+class ExactJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder for values which are read back and compared with database values, such as snapshot markers and
+    pagination cursors. Unlike DjangoJSONEncoder, datetimes and times keep their microseconds.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class JSONSerializer:
+    """
+    Serializes payloads with the json module of the standard library, see ReportJSONEncoder
+    """
+    content_type = 'application/json'
+
+    def dumps(self, data: Any) -> bytes:
+        """
+        Serialize a payload to JSON
+        :param data: the payload
+        """
+        return json.dumps(data, cls=ReportJSONEncoder, separators=(',', ':')).encode()
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    Serializes payloads with orjson, which encodes dates, times and NumPy values natively. Other values are
+    encoded by ReportJSONEncoder, which is only called for the values orjson does not support, such as decimals.
+    """
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z) if orjson else 0
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("The orjson package is required for the OrjsonSerializer")
+        self.encoder = ReportJSONEncoder()
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data, default=self.encoder.default, option=self.options)
+
+
+_serializer = None
+
+
+def get_json_serializer() -> JSONSerializer:
+    """
+    Get the serializer set by REPORTCRAFT_JSON_SERIALIZER, or the orjson serializer if orjson is installed
+    """
+    global _serializer
+    if _serializer is None:
+        if JSON_SERIALIZER:
+            _serializer = import_string(JSON_SERIALIZER)()
+        else:
+            _serializer = OrjsonSerializer() if orjson else JSONSerializer()
+    return _serializer
+
+
+class JsonDataResponse(HttpResponse):
+    """
+    An HTTP response serializing a payload with the configured JSON serializer, see get_json_serializer
+    :param data: the payload
+    """
+
+    def __init__(self, data: Any, **kwargs):
+        serializer = get_json_serializer()
+        kwargs.setdefault('content_type', serializer.content_type)
+        super().__init__(content=serializer.dumps(data), **kwargs)
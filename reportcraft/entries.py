@@ -1,15 +1,167 @@
+import heapq
+import itertools
 import math
 from collections import defaultdict
-from typing import Any, Literal
+from numbers import Number
+from typing import Any, Literal, Iterable
 
 import numpy
+from django.conf import settings
 
+from .datasets import Dataset
 from .utils import (
-    regroup_data, MinMax, epoch, get_histogram_points, wrap_table,
+    regroup_data, MinMax, epoch, get_histogram_points, get_histogram_bins, wrap_table,
     prepare_data, debug_value
 )
 
 
+# Entry attributes which hold the names of the data source fields used by each kind of entry
+ENTRY_FIELDS = {
+    'bars': ['categories', 'values', 'color_by', 'sort_by', 'facets'],
+    'columns': ['categories', 'values', 'color_by', 'sort_by', 'facets'],
+    'donut': ['value', 'label'],
+    'histogram': ['values', 'group_by'],
+    'likert': ['questions', 'answers', 'counts', 'scores', 'facets'],
+    'list': ['columns', 'order_by'],
+    'map': ['location', 'latitude', 'longitude', 'groups'],
+    'pie': ['value', 'label'],
+    'plot': ['x_value', 'group_by', 'groups'],
+    'table': ['rows', 'columns', 'values'],
+    'text': [],
+    'timeline': ['start_value', 'end_value', 'labels', 'color_by'],
+}
+
+
+def _attr_fields(value: Any) -> set[str]:
+    """
+    Extract field names from an entry attribute value, which may be a field name, a list of field names
+    or a list of series dictionaries
+    """
+    if isinstance(value, str):
+        return {value.lstrip('-')} if value else set()
+    elif isinstance(value, dict):
+        return set().union(*(_attr_fields(v) for k, v in value.items() if k != 'type'))
+    elif isinstance(value, (list, tuple)):
+        return set().union(*(_attr_fields(v) for v in value))
+    return set()
+
+
+def get_entry_fields(entry) -> set[str] | None:
+    """
+    Determine the data source fields used by an entry
+    :param entry: The report entry
+    :return: a set of field names or None if all fields may be used
+    """
+    if entry.kind not in ENTRY_FIELDS:
+        return None
+    return set().union(*(_attr_fields(entry.attrs.get(attr)) for attr in ENTRY_FIELDS[entry.kind]))
+
+
+def get_data(entry, **kwargs) -> list[dict]:
+    """
+    Fetch the cached data of an entry's data source, restricted to the fields used by the entry
+    :param entry: The report entry
+    :param kwargs: keyword arguments passed to the data source
+    """
+    return entry.source.get_data(select=entry.get_filters(), fields=entry.get_fields(), **kwargs)
+
+
+def get_dataset(entry, **kwargs) -> Dataset:
+    """
+    Fetch the cached columnar data of an entry's data source, restricted to the fields used by the entry
+    :param entry: The report entry
+    :param kwargs: keyword arguments passed to the data source
+    """
+    return entry.source.get_dataset(select=entry.get_filters(), fields=entry.get_fields(), **kwargs)
+
+
+def get_rows(entry, **kwargs) -> Iterable[dict]:
+    """
+    Fetch the rows of an entry's data source for generators which consume them in a single pass. Rows are streamed
+    from the database if the REPORTCRAFT_STREAM_ENTRIES setting is enabled, otherwise the cached data is used.
+    :param entry: The report entry
+    :param kwargs: keyword arguments passed to the data source
+    """
+    if getattr(settings, 'REPORTCRAFT_STREAM_ENTRIES', False):
+        return entry.source.iter_data(select=entry.get_filters(), fields=entry.get_fields(), **kwargs)
+    return get_data(entry, **kwargs)
+
+
+def get_sorted_data(
+        entry, sort_key: str = None, sort_desc: bool = False, limit: int = None, stream: bool = False, **kwargs
+) -> Iterable[dict]:
+    """
+    Fetch the data of an entry's source sorted by a field and limited to a number of rows. Ordering and limits are
+    applied by the database when possible, otherwise the data is sorted and sliced in Python.
+    :param entry: The report entry
+    :param sort_key: Name of the field to sort by, or None to keep the order of the source
+    :param sort_desc: Sort in descending order
+    :param limit: Maximum number of rows to return
+    :param stream: Whether the rows may be streamed from the database, see get_rows
+    :param kwargs: keyword arguments passed to the data source
+    """
+    plan = entry.source.get_plan()
+    fetch = get_rows if stream else get_data
+    if plan.can_push_down() and (sort_key or (limit and not plan.group_by)):
+        order_by = plan.get_ordering(sort_key, sort_desc) if sort_key else None
+        return fetch(entry, order_by=order_by, limit=limit, **kwargs)
+
+    data = fetch(entry, **kwargs)
+    if sort_key:
+        if limit:
+            # only keep the top rows in memory
+            select_rows = heapq.nlargest if sort_desc else heapq.nsmallest
+            return select_rows(limit, data, key=lambda x: x.get(sort_key, 0))
+        return sorted(data, key=lambda x: x.get(sort_key, 0), reverse=sort_desc)
+    elif limit:
+        return itertools.islice(data, limit)
+    return data
+
+
+def get_sorted_dataset(entry, sort_key: str = None, sort_desc: bool = False, limit: int = None, **kwargs) -> Dataset:
+    """
+    Columnar variant of get_sorted_data. Ordering and limits are applied by the database when possible, otherwise
+    the dataset is sorted and sliced.
+    :param entry: The report entry
+    :param sort_key: Name of the field to sort by, or None to keep the order of the source
+    :param sort_desc: Sort in descending order
+    :param limit: Maximum number of rows to return
+    :param kwargs: keyword arguments passed to the data source
+    """
+    plan = entry.source.get_plan()
+    if plan.can_push_down() and (sort_key or (limit and not plan.group_by)):
+        order_by = plan.get_ordering(sort_key, sort_desc) if sort_key else None
+        return get_dataset(entry, order_by=order_by, limit=limit, **kwargs)
+
+    dataset = get_dataset(entry, **kwargs)
+    if sort_key:
+        dataset = dataset.sort(sort_key, descending=sort_desc)
+    return dataset.head(limit or None)
+
+
+def sum_cells(data: Iterable[dict], keys: list[str], value_field: str) -> list[dict]:
+    """
+    Combine rows sharing the same values of the key fields, summing their values like the pivot computed in the
+    database. Missing values are skipped, and non-numeric values replace earlier ones. Rows are kept in
+    the order in which their keys first appear.
+    :param data: iterable of dictionaries
+    :param keys: names of the key fields
+    :param value_field: name of the field to sum
+    """
+    cells = {}
+    for item in data:
+        key = tuple(item.get(name) for name in keys)
+        value = item.get(value_field)
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = {**dict(zip(keys, key)), value_field: value}
+        elif isinstance(value, Number) and isinstance(cell[value_field], Number):
+            cell[value_field] += value
+        elif value is not None:
+            cell[value_field] = value
+    return list(cells.values())
+
+
 def generate_table(entry, **kwargs) -> dict:
     """
     Generate a table from the data source
@@ -37,7 +189,18 @@ def generate_table(entry, **kwargs) -> dict:
         transpose = True
     first_row_name = labels.get(columns, columns)
 
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
+    if len(rows) == 1 and values and entry.source.get_plan().can_aggregate(columns, rows[0], values):
+        # pivot in the database, only the cell values are fetched
+        raw_data = [
+            {rows[0]: row, columns: column, values: total}
+            for row, column, total in entry.source.get_summary(
+                [rows[0], columns], [values], select=entry.get_filters(), **kwargs
+            )
+        ]
+    elif len(rows) == 1 and values:
+        raw_data = sum_cells(get_data(entry, **kwargs), [rows[0], columns], values)
+    else:
+        raw_data = get_data(entry, **kwargs)
     num_columns = len(set(item[columns] for item in raw_data))
     if len(rows) == 1 and values:
         rows = rows[0]
@@ -135,26 +298,17 @@ def generate_bars(entry, kind='bars', **kwargs):
     if facet_name:
         data_fields.append(facets)
 
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
-    data = prepare_data(raw_data, select=data_fields, labels=labels, sort=sort_by, sort_desc=sort_desc)
-    if limit:
-        data = data[:limit]
+    dataset = get_sorted_dataset(entry, sort_key=sort_by, sort_desc=sort_desc, limit=limit, **kwargs)
+    dataset = dataset.select(data_fields)
 
     # If plotting multiple values, expand data to include all combinations of category and values
     if len(values) > 1:
-        expanded_data = []
-        value_keys = [labels.get(v, v) for v in values]
-        for item in data:
-            for key in value_keys:
-                new_item = {k: v for k, v in item.items() if k not in value_keys}
-                new_item['Value'] = item.get(key, 0)
-                new_item['Variable'] = key
-                expanded_data.append(new_item)
-        data = expanded_data
+        data = dataset.melt(values, variable='Variable', value='Value').to_records()
         value_name = 'Value'
         color_axis = 'Variable'
 
     else:
+        data = dataset.to_records()
         value_name = labels.get(values[0], values[0])
         color_axis = color_name
 
@@ -215,15 +369,11 @@ def generate_list(entry, **kwargs):
     if not columns:
         return {}
 
-    data = entry.source.get_data(select=entry.get_filters(), **kwargs)
-    labels = entry.source.get_labels()
-
+    sort_key, reverse = (None, False)
     if order_by:
         sort_key, reverse = (order_by[1:], True) if order_by.startswith('-') else (order_by, order_desc)
-        data = list(sorted(data, key=lambda x: x.get(sort_key, 0), reverse=reverse))
-
-    if limit:
-        data = data[:limit]
+    data = get_sorted_data(entry, sort_key=sort_key, sort_desc=reverse, limit=limit, stream=True, **kwargs)
+    labels = entry.source.get_labels()
 
     table_data = [
         [labels.get(field, field.title()) for field in columns]
@@ -264,7 +414,6 @@ def generate_plot(entry, **kwargs):
     if not (x_value and groups):
         return {}
 
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
     features = [
         {
             'type': group.pop('type', 'points'),
@@ -277,7 +426,7 @@ def generate_plot(entry, **kwargs):
 
     select_fields = {x_value} | ({group_by} if group_by else set())
     select_fields |= {group[k] for group in groups for k in ['y', 'z'] if k in group}
-    data = prepare_data(raw_data, select=select_fields, labels=labels, sort=x_value, sort_desc=False)
+    data = get_dataset(entry, **kwargs).select(select_fields).sort(x_value).to_records()
 
     return {
         'title': entry.title,
@@ -308,10 +457,13 @@ def generate_pie(entry, kind: Literal['pie', 'donut'] = 'pie', **kwargs):
     label_field = entry.attrs.get('label', '')
     labels = entry.source.get_labels()
 
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
-    data = defaultdict(int)
-    for item in raw_data:
-        data[item.get(label_field)] += item.get(value_field, 0)
+    if entry.source.get_plan().can_aggregate(label_field, value_field):
+        totals = entry.source.get_totals(label_field, value_field, select=entry.get_filters(), **kwargs)
+    else:
+        data = defaultdict(int)
+        for item in get_rows(entry, **kwargs):
+            data[item.get(label_field)] += item.get(value_field, 0)
+        totals = data.items()
 
     return {
         'title': entry.title,
@@ -319,7 +471,7 @@ def generate_pie(entry, kind: Literal['pie', 'donut'] = 'pie', **kwargs):
         'kind': kind,
         'style': entry.style,
         'scheme': colors,
-        'data': [{'label': labels.get(label, label), 'value': value} for label, value in data.items()],
+        'data': [{'label': labels.get(label, label), 'value': value} for label, value in totals],
         'notes': entry.notes
     }
 
@@ -347,14 +499,11 @@ def generate_histogram(entry, **kwargs):
     binning = entry.attrs.get('binning', 'auto')
     stack = entry.attrs.get('stack', True)
     scale = entry.attrs.get('scale', 'linear')
+    prebinned = entry.attrs.get('prebinned', False)
 
     if not values:
         return {}
 
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
-    select_fields = [values, group_by]
-    data = prepare_data(raw_data, select=select_fields, labels=labels)
-
     info = {
         'title': entry.title,
         'description': entry.description,
@@ -364,16 +513,50 @@ def generate_histogram(entry, **kwargs):
         'scale': scale,
         'stack': stack,
         'values': labels.get(values, values),
-        'data': data,
         'notes': entry.notes
     }
     if group_by:
         info['groups'] = labels.get(group_by, group_by)
 
-    info['bins'] = bins if binning == 'manual' else binning
+    if prebinned:
+        edges, counts = get_histogram(entry, values, group_by, bins=bins if binning == 'manual' else binning, **kwargs)
+        info['binned'] = True
+        info['bins'] = edges
+        info['data'] = [{'group': group, 'counts': group_counts} for group, group_counts in counts.items()]
+    else:
+        info['data'] = get_dataset(entry, **kwargs).select([values, group_by]).to_records()
+        info['bins'] = bins if binning == 'manual' else binning
     return info
 
 
+def get_histogram(entry, value_field: str, group_field: str = None, bins: Any = 'auto', **kwargs) -> tuple[list, dict]:
+    """
+    Bin the values of a field for a histogram. Values are binned in the database for equal-width bins when the
+    source allows it, otherwise the values are fetched and binned with numpy.
+    :param entry: The report entry
+    :param value_field: Name of the field to bin
+    :param group_field: Name of the field to count bins separately for, or None
+    :param bins: Number of bins or the name of a binning method, the "auto" method uses Sturges' rule
+    :param kwargs: keyword arguments passed to the data source
+    :return: a tuple of the bin edges and a dictionary mapping each group to the counts in each bin
+    """
+    group_fields = [group_field] if group_field else []
+    if bins in ('auto', 'sturges') or isinstance(bins, int):
+        if entry.source.get_plan().can_aggregate(value_field, *group_fields):
+            histogram = entry.source.get_histogram(
+                value_field, bins=bins if isinstance(bins, int) else None, group_field=group_field,
+                select=entry.get_filters(), **kwargs
+            )
+            if histogram is not None:
+                return histogram
+
+    data, groups = [], []
+    for item in get_rows(entry, **kwargs):
+        data.append(item.get(value_field))
+        groups.append(item.get(group_field) if group_field else None)
+    return get_histogram_bins(data, groups, bins=bins)
+
+
 def generate_timeline(entry, **kwargs):
     """
     Generate a timeline from the data source
@@ -392,8 +575,7 @@ def generate_timeline(entry, **kwargs):
         return {}
 
     select_fields = [field for field in [start_value, end_value, label_value, color_by] if field]
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
-    data = prepare_data(raw_data, select=select_fields, labels=labels, sort=start_value, sort_desc=False)
+    data = get_dataset(entry, **kwargs).select(select_fields).sort(start_value).to_records()
 
     return {
         'title': entry.title,
@@ -444,7 +626,6 @@ def generate_geochart(entry, **kwargs):
     map_labels = entry.attrs.get('map_labels', None)
     scheme = entry.attrs.get('scheme', 'Live8')
 
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
     features = [
         {
             'type': group.get('type', 'area'),
@@ -455,7 +636,7 @@ def generate_geochart(entry, **kwargs):
 
     select_fields = {field for field in [location, latitude, longitude] if field}
     select_fields |= {group['value'] for group in groups if 'value' in group}
-    data = prepare_data(raw_data, select=select_fields, labels=labels)
+    data = get_dataset(entry, **kwargs).select(select_fields).to_records()
 
     return {
         'title': entry.title,
@@ -488,7 +669,7 @@ def generate_likert(entry, **kwargs):
         key: entry.attrs.get(key, '')
         for key in ['questions', 'answers', 'counts', 'scores', 'facets']
     }
-    raw_data = entry.source.get_data(select=entry.get_filters(), **kwargs)
+    raw_data = get_data(entry, **kwargs)
     domain = sorted({
         (item.get(settings['answers']), item.get(settings['scores']))
         for item in raw_data}, key=lambda x: x[1]
@@ -42,13 +42,16 @@ class AutoPopulatedSlugField(forms.TextInput):
 class ReportForm(ModalModelForm):
     class Meta:
         model = models.Report
-        fields = ('title', 'section', 'slug', 'description', 'theme', 'notes')
+        fields = ('title', 'section', 'slug', 'description', 'theme', 'notes', 'cache_control')
         widgets = {
             'title': forms.TextInput,
             'description': forms.Textarea(attrs={'rows': "2"}),
             'notes': forms.Textarea(attrs={'rows': "4"}),
             'slug': AutoPopulatedSlugField(src_field='title'),
         }
+        help_texts = {
+            'cache_control': _("Cache-Control header of the report data, e.g. \"private, max-age=60\""),
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -65,6 +68,9 @@ class ReportForm(ModalModelForm):
             Row(
                 FullWidth('notes'),
             ),
+            Row(
+                FullWidth('cache_control'),
+            ),
         )
 
 
@@ -132,16 +138,23 @@ class DataSourceForm(ModalModelForm):
     class Meta:
         model = models.DataSource
         fields = (
-            'name', 'group_by', 'limit', 'group_fields', 'description', 'filters'
+            'name', 'group_by', 'limit', 'group_fields', 'description', 'filters',
+            'snapshot_ttl', 'incremental_field', 'snapshot_filters', 'cache_policy', 'cache_ttl',
         )
         widgets = {
             'group_by': forms.HiddenInput,
             'description': forms.Textarea(attrs={'rows': "2"}),
             'filters': forms.Textarea(attrs={'rows': "2"}),
+            'snapshot_filters': forms.Textarea(attrs={'rows': "2"}),
         }
         help_texts = {
             'limit': _("Maximum number of records"),
-            'filters': _("Use only field names from the source. ")
+            'filters': _("Use only field names from the source. "),
+            'snapshot_ttl': _("Seconds snapshots remain fresh, leave empty to disable snapshots"),
+            'incremental_field': _("Increasing field of an append-only model, for incremental snapshots"),
+            'snapshot_filters': _("List of dynamic filter combinations to snapshot, e.g. [{\"year\": 2024}]"),
+            'cache_policy': _("Adaptive policies cache expensive sources for longer"),
+            'cache_ttl': _("Seconds before cached results are refreshed, for fixed policies"),
         }
 
     def __init__(self, *args, **kwargs):
@@ -153,6 +166,11 @@ class DataSourceForm(ModalModelForm):
                 Div('limit', css_class='col-sm-4'),
                 Div('description', css_class='col-12'),
                 Div(Field('filters', css_class='font-monospace'), css_class='col-12'),
+                Div('snapshot_ttl', css_class='col-sm-6'),
+                Div('incremental_field', css_class='col-sm-6'),
+                Div(Field('snapshot_filters', css_class='font-monospace'), css_class='col-12'),
+                Div('cache_policy', css_class='col-sm-6'),
+                Div('cache_ttl', css_class='col-sm-6'),
                 css_class='row'
             )
         )
@@ -169,6 +187,9 @@ class DataSourceForm(ModalModelForm):
                 parser.parse(filters)
             except ValueError as e:
                 self.add_error('filters', _(f"Invalid filter: {e}"))
+        snapshot_filters = data.get('snapshot_filters') or []
+        if not (isinstance(snapshot_filters, list) and all(isinstance(item, dict) for item in snapshot_filters)):
+            self.add_error('snapshot_filters', _("Must be a list of filter dictionaries"))
         return data
 
 
@@ -830,9 +851,13 @@ class HistogramForm(EntryConfigForm):
             ('manual', 'Manual'),
         ),
     )
+    prebinned = forms.BooleanField(
+        label='Bin on Server', required=False, initial=False,
+        widget=forms.Select(choices=((True, 'Yes'), (False, 'No'))),
+    )
 
     SINGLE_FIELDS = ['values', 'group_by']
-    OTHER_FIELDS = ['bins', 'scheme', 'binning', 'stack', 'scale']
+    OTHER_FIELDS = ['bins', 'scheme', 'binning', 'stack', 'scale', 'prebinned']
 
     class Meta:
         model = models.Entry
@@ -849,7 +874,7 @@ class HistogramForm(EntryConfigForm):
             Row(
                 HalfWidth('values'),HalfWidth('scale'),
                 ThirdWidth('group_by'), ThirdWidth('scheme'), ThirdWidth('stack'),
-                HalfWidth('binning'), HalfWidth('bins'),
+                ThirdWidth('binning'), ThirdWidth('bins'), ThirdWidth('prebinned'),
             ),
             Row(
 
@@ -7,6 +7,7 @@ from django.apps import apps
 from django.db import models
 from django.db.models import Window, Sum, F, Case, When, Value as V, TextField, CharField, Count
 from django.db.models.expressions import RowRange
+from django.db.models.functions import Cast, Floor, Least
 from django.utils import timezone
 
 
@@ -286,3 +287,41 @@ class Interval(Case):
                 )
 
         super().__init__(*whens, output_field=CharField(), default=V(""), **extra)
+
+
+class Bucket(models.Func):
+    """
+    A Django database function which assigns a numeric value to one of `count` equal-width bins
+    between `lo` and `hi`. Bins are numbered from 0 and values equal to `hi` fall in the last bin.
+
+    WIDTH_BUCKET is used on PostgreSQL, other backends use arithmetic bucketing.
+
+    Args:
+        expression (str): The name of the field or expression to evaluate.
+        lo (int or float): The lower edge of the first bin.
+        hi (int or float): The upper edge of the last bin.
+        count (int): The number of bins.
+    """
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, *, lo, hi, count, **extra):
+        if not isinstance(count, int) or count < 1:
+            raise ValueError("The 'count' argument must be a positive integer.")
+
+        self.lo, self.hi, self.count = float(lo), float(hi), count
+        width = (self.hi - self.lo) / count or 1.0
+        value = Cast(F(expression) if isinstance(expression, str) else expression, models.FloatField())
+        bucket = Least(
+            Cast(Floor((value - V(self.lo)) / V(width)), models.IntegerField()), V(count - 1)
+        )
+        super().__init__(value, bucket, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return compiler.compile(self.get_source_expressions()[1])
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        value_sql, params = compiler.compile(self.get_source_expressions()[0])
+        return (
+            f'LEAST(WIDTH_BUCKET({value_sql}, %s, %s, %s), %s) - 1',
+            (*params, self.lo, self.hi, self.count, self.count)
+        )
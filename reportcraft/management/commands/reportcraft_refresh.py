@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from reportcraft.models import DataSource
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the snapshots of data sources. The full results of each source are snapshot, together with the "
+        "results for each of its declared snapshot filter combinations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*', type=str,
+            help="Codes or names of the data sources to refresh. Defaults to all sources with snapshots enabled."
+        )
+        parser.add_argument(
+            '--full', action='store_true', help="Recompute snapshots fully, even for incremental sources."
+        )
+        parser.add_argument(
+            '--stale', action='store_true', help="Only refresh snapshots older than the staleness limit of the source."
+        )
+
+    def handle(self, *args, **options):
+        sources = DataSource.objects.filter(snapshot_ttl__isnull=False).exclude(snapshot_ttl=0)
+        if options['sources']:
+            sources = DataSource.objects.filter(Q(code__in=options['sources']) | Q(name__in=options['sources']))
+            if not sources.exists():
+                raise CommandError(f"No data sources found matching: {', '.join(options['sources'])}")
+
+        for source in sources:
+            for filters in [{}, *(source.snapshot_filters or [])]:
+                if options['stale'] and source.get_snapshot(filters) is not None:
+                    continue
+                try:
+                    snapshot = source.refresh_snapshot(filters, incremental=not options['full'])
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"{source} {filters}: {e}"))
+                    continue
+                self.stdout.write(
+                    f"{timezone.localtime():%Y-%m-%d %H:%M:%S} {source} {filters}: "
+                    f"{snapshot.size} rows, {len(snapshot.data) / 1024:.1f} KiB, {snapshot.duration:.2f}s"
+                )
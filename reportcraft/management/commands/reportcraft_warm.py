@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from reportcraft import caching
+from reportcraft.models import Report
+from reportcraft.views import DataView
+
+
+class Command(BaseCommand):
+    help = (
+        "Warm the cache by rendering reports, without filters and for the most requested filter combinations "
+        "recorded when REPORTCRAFT_RECORD_ACCESS is set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'reports', nargs='*', type=str, help="Slugs of the reports to render. Defaults to all reports."
+        )
+        parser.add_argument('--section', type=str, help="Only render reports in this section.")
+        parser.add_argument(
+            '--top', type=int, default=None,
+            help="Number of recorded filter combinations to render per report. Defaults to REPORTCRAFT_RECORD_ACCESS."
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1, help="Number of reports rendered at the same time."
+        )
+
+    def handle(self, *args, **options):
+        reports = Report.objects.all()
+        if options['section']:
+            reports = reports.filter(section=options['section'])
+        if options['reports']:
+            reports = reports.filter(slug__in=options['reports'])
+        if not reports.exists():
+            raise CommandError("No reports found")
+
+        top = caching.RECORD_ACCESS if options['top'] is None else options['top']
+        tasks = [
+            (report.slug, filters)
+            for report in reports
+            for filters in [{}, *(caching.get_top_filters(report.slug, top) if top else [])]
+        ]
+        if options['concurrency'] > 1:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                results = list(executor.map(self.warm_concurrently, tasks))
+        else:
+            results = [self.warm(slug, filters) for slug, filters in tasks]
+
+        for (slug, filters), (duration, error) in zip(tasks, results):
+            if error:
+                self.stderr.write(self.style.ERROR(f"{slug} {filters}: {error}"))
+            else:
+                self.stdout.write(f"{slug} {filters}: {duration:.2f}s")
+
+    def warm_concurrently(self, task: tuple[str, dict]) -> tuple[float, str]:
+        """
+        Render a report in a worker thread and release the thread's database connections afterwards
+        :param task: a tuple of the report slug and the dynamic filters
+        """
+        try:
+            return self.warm(*task)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def warm(slug: str, filters: dict) -> tuple[float, str]:
+        """
+        Render a report through the report data view
+        :param slug: the slug of the report
+        :param filters: the dynamic filters
+        :return: a tuple of the duration in seconds and an error message, if any
+        """
+        view = DataView()
+        view.request = RequestFactory().get(reverse('report-data', kwargs={'slug': slug}), data=filters)
+        view.kwargs = {'slug': slug}
+        start = time.perf_counter()
+        try:
+            view.get_report(slug=slug)
+        except Exception as e:
+            return time.perf_counter() - start, str(e)
+        return time.perf_counter() - start, ''
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:29
+
+import django.core.serializers.json
+import django.db.models.deletion
+import reportcraft.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportcraft', '0016_remove_uuid_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='incremental_field',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Incremental Field'),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='snapshot_filters',
+            field=models.JSONField(blank=True, default=list, verbose_name='Snapshot Filters'),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='snapshot_ttl',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Snapshot Staleness'),
+        ),
+        migrations.CreateModel(
+            name='DataSourceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=64)),
+                ('filters', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('data', models.BinaryField(default=b'')),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('marker', models.JSONField(blank=True, encoder=reportcraft.encoders.ExactJSONEncoder, null=True)),
+                ('duration', models.FloatField(default=0.0)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='reportcraft.datasource')),
+            ],
+            options={
+                'verbose_name': 'Data Source Snapshot',
+                'constraints': [models.UniqueConstraint(fields=('source', 'key'), name='unique_source_snapshot')],
+            },
+        ),
+    ]
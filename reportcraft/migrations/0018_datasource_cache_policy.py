@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportcraft', '0017_datasource_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='cache_policy',
+            field=models.CharField(choices=[('default', 'Default'), ('fixed', 'Fixed'), ('adaptive', 'Adaptive')], default='default', max_length=20, verbose_name='Cache Policy'),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Cache Duration'),
+        ),
+    ]
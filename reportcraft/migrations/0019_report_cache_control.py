@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportcraft', '0018_datasource_cache_policy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='cache_control',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='Cache Control'),
+        ),
+    ]
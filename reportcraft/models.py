@@ -1,21 +1,35 @@
 from __future__ import annotations
 
+import functools
+import hashlib
 import itertools
+import json
 import logging
+import math
+import pickle
 import re
+import time
 import traceback
 import uuid
-from typing import Any
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Iterator, Iterable
 
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import QuerySet, Q
-from django.db.models.functions import Round, Abs, Sign
+from django.db.models import QuerySet, Q, F, OuterRef, Subquery, Sum, Min, Max, Count
+from django.db.models.functions import Round
+from django.db.models.lookups import IsNull
+from django.utils import timezone
 from django.utils.text import slugify, gettext_lazy as _
 
 import reportcraft.functions
-from . import utils, entries
+from . import caching, utils, entries, plans
+from .datasets import Dataset
+from .encoders import ExactJSONEncoder
 
 
 logger = logging.getLogger('reportcraft')
@@ -56,6 +70,11 @@ class CodeManager(models.Manager):
 
 
 class DataSource(models.Model):
+    class CachePolicies(models.TextChoices):
+        DEFAULT = 'default', _('Default')
+        FIXED = 'fixed', _('Fixed')
+        ADAPTIVE = 'adaptive', _('Adaptive')
+
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
     code = models.SlugField(max_length=100, unique=True, editable=False, default=uuid.uuid4)
@@ -64,6 +83,13 @@ class DataSource(models.Model):
     group_by = models.JSONField(_("Group Fields"), default=list, blank=True, null=True)
     filters = models.TextField(default="", blank=True)
     limit = models.IntegerField(null=True, blank=True)
+    snapshot_ttl = models.PositiveIntegerField(_("Snapshot Staleness"), null=True, blank=True)
+    snapshot_filters = models.JSONField(_("Snapshot Filters"), default=list, blank=True)
+    incremental_field = models.CharField(_("Incremental Field"), max_length=100, default='', blank=True)
+    cache_policy = models.CharField(
+        _("Cache Policy"), max_length=20, choices=CachePolicies.choices, default=CachePolicies.DEFAULT
+    )
+    cache_ttl = models.PositiveIntegerField(_("Cache Duration"), null=True, blank=True)
 
     objects = CodeManager()
 
@@ -116,14 +142,52 @@ class DataSource(models.Model):
         return self.fields.exclude(name__in=self.group_by)
 
     def get_filters(self):
-        parser = utils.FilterParser()
         if self.filters:
-            return parser.parse(self.filters, silent=True)
+            return utils.parse_filters(self.filters, silent=True)
         else:
             return Q()
 
+    def get_plan(self) -> plans.SourcePlan:
+        """
+        Get the compiled query plan for this data source
+        """
+        return plans.get_plan(self)
+
+    def get_cache_version(self) -> str:
+        """
+        Get the version of cached results for this data source, which changes when the definition of the source or
+        the data of any model it reads changes.
+        """
+        return plans.get_cache_version(self.pk)
+
+    def get_cache_duration(self) -> float:
+        """
+        Get the number of seconds before cached results of this source are refreshed. Fixed policies use the cache
+        duration of the source or the REPORTCRAFT_CACHE_DURATION setting, adaptive policies scale the duration with
+        the measured compute time of the source. The default policy is set by REPORTCRAFT_CACHE_POLICY.
+        """
+        policy = self.cache_policy
+        if policy == self.CachePolicies.DEFAULT:
+            policy = caching.CACHE_POLICY
+        if policy == self.CachePolicies.ADAPTIVE:
+            return caching.adaptive_duration(self.get_compute_time())
+        return self.cache_ttl or caching.CACHE_DURATION
+
+    def get_compute_time(self) -> float:
+        """
+        Get the average time in seconds taken to compute cached results of this source, 0 if not yet measured
+        """
+        return caching.get_compute_time(self.pk)
+
+    def record_compute_time(self, duration: float):
+        """
+        Record the time taken to compute a cached result of this source, see get_compute_time
+        :param duration: the compute time in seconds
+        """
+        caching.record_compute_time(self.pk, duration)
+
     def get_labels(self):
-        return {field.name: field.label for field in self.fields.all()}
+        return dict(self.get_plan().labels)
 
     def clean_filters(self, filters: dict) -> dict:
         """
@@ -131,18 +195,16 @@ class DataSource(models.Model):
         :param filters: dictionary of filters
         :return: cleaned filters
         """
-        valid_fields = set(self.fields.values_list('name', flat=True))
-        return {
-            k: v for k, v in filters.items()
-            if k.split('__')[0] in valid_fields and k.count('__') < 2       # Only allow one level of lookups
-        }
+        return self.get_plan().clean_filters(filters)
 
     def get_queryset(
             self,
             model_name,
             filters: dict = None,
             select: Q = None,
-            order_by: list = None
+            order_by: list = None,
+            fields: Iterable[str] = None,
+            limit: int = None
     ) -> QuerySet:
         """
         Generate a queryset for the given model name with the specified filters and order by fields.
@@ -150,97 +212,354 @@ class DataSource(models.Model):
         :param filters: dynamic filters to apply
         :param select: additional Q object to apply as filter to select a subset of data
         :param order_by: order by fields
+        :param fields: names of the fields to annotate, all fields are annotated if None
+        :param limit: maximum number of rows to return, in addition to the limit of the data source
         :return: a queryset for the specified model with applied annotations, filters and ordering
         """
 
         filters = {} if not filters else filters
-        order_by = [] if not order_by else order_by
-
+        plan = self.get_plan()
+        model_plan = plan.get_model(model_name)
         model: Any = apps.get_model(model_name)
-        field_names = [f.name for f in model._meta.get_fields()]
-
-        # Add annotations
-        group_by = list(self.group_by)
-        annotate_filter = {'name__in': group_by} if group_by else {}
-        annotations = {
-            field.name: field.get_expression()
-            for field in self.fields.exclude(name__in=field_names).filter(model__name=model_name, **annotate_filter)
-        }
-
-        # Add aggregations and handle grouping
-        aggregations = {}
-        if group_by:
-            aggregations = {
-                field.name: field.get_expression()
-                for field in self.fields.exclude(name__in=field_names).exclude(name__in=group_by).filter(model__name=model_name)
-            }
+        fields = plan.get_fields(fields, filters=filters, select=select, order_by=order_by)
 
         # Ordering
-        order_fields = self.fields.annotate(
-            order_by=Abs('ordering')
-        ).filter(ordering__isnull=False).order_by('order_by').values_list(Sign('ordering'), 'name', )
-        order_by: list = order_by or [f'-{name}' if sign < 0 else name for sign, name in order_fields]
+        order_by: list = order_by or plan.order_by
 
         # Apply static filters
-        static_filters = self.get_filters()
+        static_filters = plan.get_filters()
         select_filters = (select if select else Q())
-        dynamic_filters = Q(**self.clean_filters(filters))
+        dynamic_filters = Q(**plan.clean_filters(filters))
 
         # generate the queryset
         queryset = model.objects.annotate(
-            **annotations
-        ).values(*group_by).annotate(
-            **aggregations
+            **model_plan.get_annotations(fields)
+        ).values(*plan.group_by).annotate(
+            **model_plan.get_aggregations(fields)
         ).order_by(*order_by).filter(
             static_filters & dynamic_filters & select_filters
         )
         # Apply limit
-        if self.limit:
-            queryset = queryset[:self.limit]
+        if plan.limit:
+            queryset = queryset[:plan.limit]
+        if limit:
+            queryset = queryset[:limit]
 
         return queryset
 
-    def get_source_data(self, filters=None, select=None, order_by=None) -> list[dict]:
+    def get_source_data(self, filters=None, select=None, order_by=None, fields=None, limit=None) -> list[dict]:
         """
         Generate data for this data source
         :param filters: dynamic filters
         :param select: additional Q object to apply as filter to select a subset of data
         :param order_by: order by fields
-
+        :param fields: names of the fields to fetch, all fields are fetched if None. Group-by fields are always
+            included.
+        :param limit: maximum number of rows to return
         """
 
-        data = []
-        model_names = set(self.fields.values_list('model__name', flat=True))
-        for model_name in model_names:
-            queryset = self.get_queryset(model_name, filters=filters, select=select, order_by=order_by)
-            field_names = [field.name for field in self.fields.filter(model__name=model_name).all()]
-            data.extend(list(queryset.values(*field_names)))
+        plan = self.get_plan()
+        single = plan.is_single_model()
+        required = plan.get_fields(fields, filters=filters, select=select, order_by=order_by)
+        queries = [
+            functools.partial(
+                list,
+                self.get_queryset(
+                    model_name, filters=filters, select=select, order_by=order_by, fields=required,
+                    limit=limit if single else None
+                ).values(*model_plan.get_field_names(required))
+            )
+            for model_name, model_plan in plan.models.items()
+        ]
+        data = list(itertools.chain.from_iterable(utils.run_queries(queries)))
+
+        # A single grouped query explicitly ordered by the caller is already unique and must keep its order.
+        # Otherwise merged groups are sorted naturally unless the source defines an ordering of its own.
+        if plan.group_by and not (single and order_by):
+            data = utils.merge_data(data, unique=plan.group_by, sort=not (order_by or plan.order_by))
 
-        if self.group_by:
-            data = utils.merge_data(data, unique=self.group_by)
+        if limit and not single:
+            data = data[:limit]
 
         return data
 
-    @utils.cached_model_method(duration=1)
-    def get_data(self, filters=None, select=None, order_by=None) -> list[dict]:
+    def iter_data(
+            self, filters=None, select=None, order_by=None, fields=None, limit=None, chunk_size=2000
+    ) -> Iterator[dict]:
         """
-        Cached wrapper of get_source_data.
+        Stream data for this data source. Rows are read from the database in chunks, using server-side cursors where
+        the database supports them, so memory use is constant. Rows of grouped sources are merged and sorted like
+        those of get_source_data as they are read, unless ordered explicitly, so memory use is bounded by the number
+        of groups.
         :param filters: dynamic filters
         :param select: additional Q object to apply as filter to select a subset of data
         :param order_by: order by fields
+        :param fields: names of the fields to fetch, all fields are fetched if None
+        :param limit: maximum number of rows to return
+        :param chunk_size: number of rows to fetch from the database at a time
         """
-        return self.get_source_data(filters=filters, select=select, order_by=order_by)
+        plan = self.get_plan()
+        single = plan.is_single_model()
+        required = plan.get_fields(fields, filters=filters, select=select, order_by=order_by)
+        rows = itertools.chain.from_iterable(
+            self.get_queryset(
+                model_name, filters=filters, select=select, order_by=order_by, fields=required,
+                limit=limit if single else None
+            ).values(*model_plan.get_field_names(required)).iterator(chunk_size=chunk_size)
+            for model_name, model_plan in plan.models.items()
+        )
+        # same merging and ordering of groups as get_source_data, the database does not guarantee the order of groups
+        if plan.group_by and not (single and order_by):
+            rows = utils.merge_data(rows, unique=plan.group_by, sort=not (order_by or plan.order_by))
+        yield from itertools.islice(rows, limit) if limit else rows
+
+    def get_page(self, filters=None, cursor: str = None, size: int = 1000) -> tuple[list[dict], str | None]:
+        """
+        Fetch a page of data for this data source. Single-model sources are paged by key, ungrouped sources in order of
+        their primary keys and grouped sources in order of their group-by fields, so pages are stable while data
+        changes and deep pages are as fast as the first. Other sources, sources with a limit and ungrouped sources
+        with fields following to-many relations are paged by offset into their cached data, in their usual order.
+        :param filters: dynamic filters
+        :param cursor: cursor of the page returned with the previous page, None for the first page
+        :param size: maximum number of rows in the page
+        :return: a tuple of the rows and the cursor of the next page, None for the last page
+        :raises ValueError: if the cursor is not valid
+        """
+        plan = self.get_plan()
+        position = utils.decode_cursor(cursor) if cursor else {}
+        # rows of ungrouped sources following to-many relations repeat primary keys, so they cannot be paged by key
+        if not plan.is_single_model() or plan.limit or (not plan.group_by and plan.multi_valued):
+            offset = position.get('offset', 0)
+            if not isinstance(offset, int) or offset < 0:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            data = self.get_data(filters=filters)
+            rows = data[offset:offset + size]
+            end = offset + len(rows)
+            return rows, utils.encode_cursor({'offset': end}) if end < len(data) else None
+
+        keys = plan.group_by or ['pk']
+        after = position.get('after')
+        if after is not None and (not isinstance(after, list) or len(after) != len(keys)):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        model_name, model_plan = next(iter(plan.models.items()))
+        names = model_plan.get_field_names()
+        rows = list(
+            self.get_queryset(
+                model_name, filters=filters, select=utils.keyset_filter(keys, after) if after else None,
+                order_by=[F(key).asc(nulls_first=True) for key in keys], limit=size + 1
+            ).values(*names, *[key for key in keys if key not in names])
+        )
+        more = len(rows) > size
+        rows = rows[:size]
+        next_cursor = utils.encode_cursor({'after': [rows[-1][key] for key in keys]}) if more else None
+        for key in keys:
+            if key not in names:
+                for row in rows:
+                    del row[key]
+        return rows, next_cursor
+
+    @utils.cached_model_method()
+    def get_data(self, filters=None, select=None, order_by=None, fields=None, limit=None) -> list[dict]:
+        """
+        Cached wrapper of get_source_data. Data is served from a fresh snapshot if one exists for the filters.
+        :param filters: dynamic filters
+        :param select: additional Q object to apply as filter to select a subset of data
+        :param order_by: order by fields
+        :param fields: names of the fields to fetch, all fields are fetched if None
+        :param limit: maximum number of rows to return
+        """
+        data = self.get_snapshot_data(filters=filters, select=select, order_by=order_by, limit=limit)
+        if data is not None:
+            return data
+        return self.get_source_data(filters=filters, select=select, order_by=order_by, fields=fields, limit=limit)
+
+    def get_snapshot(self, filters=None) -> DataSourceSnapshot | None:
+        """
+        Fetch the snapshot for the given filters if it is not older than the staleness limit of the source.
+        :param filters: dynamic filters
+        :return: the snapshot or None if snapshots are disabled for this source or no fresh snapshot exists
+        """
+        if not self.snapshot_ttl:
+            return None
+        key = DataSourceSnapshot.make_key(self.clean_filters(filters or {}))
+        return self.snapshots.filter(
+            key=key, modified__gte=timezone.now() - timedelta(seconds=self.snapshot_ttl)
+        ).first()
+
+    def get_snapshot_data(self, filters=None, select=None, order_by=None, limit=None) -> list[dict] | None:
+        """
+        Fetch data from a fresh snapshot, ordered and limited as requested. Snapshots hold the full results for a set
+        of dynamic filters, so they can not be used to select a subset of data.
+        :param filters: dynamic filters
+        :param select: additional Q object to apply as filter to select a subset of data
+        :param order_by: order by fields
+        :param limit: maximum number of rows to return
+        :return: a list of dictionaries or None if no fresh snapshot is available
+        """
+        snapshot = None if select else self.get_snapshot(filters)
+        if snapshot is None:
+            return None
+        return utils.sort_data(snapshot.get_data(), order_by=order_by, limit=limit)
+
+    def refresh_snapshot(self, filters=None, incremental=True) -> DataSourceSnapshot:
+        """
+        Compute and store the snapshot of this source for the given filters. If the source has an incremental field,
+        only rows with values of the field beyond those already in the snapshot are fetched. Incremental refresh
+        assumes the model only grows and is only possible for single-model sources without grouping or a limit.
+        :param filters: dynamic filters
+        :param incremental: allow incremental refresh, otherwise the full results are computed
+        """
+        plan = self.get_plan()
+        filters = self.clean_filters(filters or {})
+        snapshot = self.snapshots.filter(key=DataSourceSnapshot.make_key(filters)).first()
+        if snapshot is None:
+            snapshot = DataSourceSnapshot(source=self, key=DataSourceSnapshot.make_key(filters), filters=filters)
+
+        field = self.incremental_field
+        start = time.perf_counter()
+        if (
+            incremental and field in plan.valid_filters and snapshot.pk and snapshot.marker is not None
+            and plan.can_push_down() and not plan.group_by
+        ):
+            data = snapshot.get_data() + self.get_source_data(filters={**filters, f'{field}__gt': snapshot.marker})
+            data = utils.sort_data(data, order_by=plan.order_by)
+        else:
+            data = self.get_source_data(filters=filters)
+
+        if field:
+            snapshot.marker = max((item[field] for item in data if item.get(field) is not None), default=None)
+        snapshot.set_data(data)
+        snapshot.duration = time.perf_counter() - start
+        snapshot.save()
+        plans.bump_data_versions([self.pk])
+        return snapshot
+
+    @utils.cached_model_method()
+    def get_dataset(self, filters=None, select=None, order_by=None, fields=None, limit=None) -> Dataset:
+        """
+        Columnar variant of get_data. Rows of single-model sources are read with values_list directly into columns,
+        sources whose rows must be merged by group, and snapshots, are converted from lists of dictionaries.
+        :param filters: dynamic filters
+        :param select: additional Q object to apply as filter to select a subset of data
+        :param order_by: order by fields
+        :param fields: names of the fields to fetch, all fields are fetched if None
+        :param limit: maximum number of rows to return
+        """
+        plan = self.get_plan()
+        data = self.get_snapshot_data(filters=filters, select=select, order_by=order_by, limit=limit)
+        if data is not None:
+            return Dataset.from_records(data, labels=plan.labels)
+        if not plan.is_single_model() or (plan.group_by and not order_by):
+            return Dataset.from_records(
+                self.get_source_data(filters=filters, select=select, order_by=order_by, fields=fields, limit=limit),
+                labels=plan.labels
+            )
+
+        required = plan.get_fields(fields, filters=filters, select=select, order_by=order_by)
+        model_name, model_plan = next(iter(plan.models.items()))
+        names = model_plan.get_field_names(required)
+        queryset = self.get_queryset(
+            model_name, filters=filters, select=select, order_by=order_by, fields=required, limit=limit
+        )
+        return Dataset.from_rows(names, queryset.values_list(*names), labels=plan.labels)
+
+    @utils.cached_model_method()
+    def get_summary(self, group_fields: list[str], value_fields: list[str], filters=None, select=None) -> list[tuple]:
+        """
+        Sum fields by the values of other fields in the database. Only valid if the plan of the source
+        allows the fields to be aggregated, see SourcePlan.can_aggregate.
+        :param group_fields: names of the fields to group by
+        :param value_fields: names of the fields to sum
+        :param filters: dynamic filters
+        :param select: additional Q object to apply as filter to select a subset of data
+        :return: a list of tuples of the group values followed by the totals. Groups are in the order in which they
+            first appear in the rows of the source, as when the rows are grouped in Python.
+        """
+        plan = self.get_plan()
+        ordering = [*plan.order_by, 'pk']
+        queryset = self.get_queryset(
+            plan.model_names[0], filters=filters, select=select, fields=[*group_fields, *value_fields]
+        )
+        first_rows = self.get_queryset(
+            plan.model_names[0], filters=filters, select=select, order_by=ordering, fields=group_fields
+        ).filter(*[
+            Q(**{field: OuterRef(field)}) | Q(IsNull(OuterRef(field), True), **{f'{field}__isnull': True})
+            for field in group_fields
+        ])
+
+        # order groups by the ordering values of their first row
+        totals = {f'reportcraft_total_{i}': Sum(field) for i, field in enumerate(value_fields)}
+        firsts = {
+            f'reportcraft_first_{i}': Subquery(first_rows.values(name.lstrip('-'))[:1])
+            for i, name in enumerate(ordering)
+        }
+        return list(
+            queryset.values(*group_fields).annotate(**totals, **firsts).order_by(*[
+                f'-{key}' if name.startswith('-') else key for name, key in zip(ordering, firsts)
+            ]).values_list(*group_fields, *totals.keys())
+        )
+
+    def get_totals(self, group_field: str, value_field: str, filters=None, select=None) -> list[tuple]:
+        """
+        Sum a field by the values of another field in the database, see get_summary.
+        :param group_field: name of the field to group by
+        :param value_field: name of the field to sum
+        :param filters: dynamic filters
+        :param select: additional Q object to apply as filter to select a subset of data
+        :return: a list of (group value, total) tuples, in the order in which the groups first appear
+        """
+        return self.get_summary([group_field], [value_field], filters=filters, select=select)
+
+    @utils.cached_model_method()
+    def get_histogram(
+            self, value_field: str, bins: int = None, group_field: str = None, filters=None, select=None
+    ) -> tuple[list[float], dict] | None:
+        """
+        Bin the values of a field into equal-width bins in the database. Only valid if the plan of the source
+        allows the fields to be aggregated, see SourcePlan.can_aggregate.
+        :param value_field: name of the numeric field to bin
+        :param bins: number of bins, Sturges' rule is used if not provided
+        :param group_field: optional name of a field to count bins separately for each of its values
+        :param filters: dynamic filters
+        :param select: additional Q object to apply as filter to select a subset of data
+        :return: a tuple of the bin edges and a dictionary mapping each group to the counts in each bin, or None
+            if the values are not numeric
+        """
+        plan = self.get_plan()
+        group_fields = [group_field] if group_field else []
+        queryset = self.get_queryset(
+            plan.model_names[0], filters=filters, select=select, fields=[value_field, *group_fields]
+        ).filter(**{f'{value_field}__isnull': False}).order_by()
+
+        stats = queryset.aggregate(lo=Min(value_field), hi=Max(value_field), total=Count(value_field))
+        lo, hi, total = stats['lo'], stats['hi'], stats['total']
+        if not total:
+            return [], {}
+        if not all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in (lo, hi)):
+            return None
+
+        bins = int(bins) if bins else math.ceil(math.log2(total)) + 1
+        lo, hi = float(lo), float(hi)
+        if lo == hi:
+            # widen the range of equal values like numpy, WIDTH_BUCKET rejects empty ranges
+            lo, hi = lo - 0.5, hi + 0.5
+        edges = [lo + (hi - lo) * i / bins for i in range(bins)] + [hi]
+        counts = {}
+        for row in queryset.annotate(
+            reportcraft_bin=reportcraft.functions.Bucket(value_field, lo=lo, hi=hi, count=bins)
+        ).values(*group_fields, 'reportcraft_bin').annotate(
+            reportcraft_count=Count(value_field)
+        ).order_by(*group_fields, 'reportcraft_bin'):
+            group = row[group_field] if group_field else None
+            counts.setdefault(group, [0] * bins)[row['reportcraft_bin']] += row['reportcraft_count']
+        return edges, counts
 
     def get_precision(self, field_name: str) -> int:
         """
         Get the precision for a field in this data source
         :param field_name: the name of the field
         """
-        try:
-            field = self.fields.get(name=field_name)
-            return field.precision if field.precision is not None else 0
-        except DataField.DoesNotExist:
-            return 0
+        return self.get_plan().precisions.get(field_name, 0)
 
     def snippet(self, filters=None, order_by=None, size=50) -> tuple[list[dict], int]:
         """
@@ -262,6 +581,60 @@ class DataSource(models.Model):
         return result, total
 
 
+class DataSourceSnapshot(models.Model):
+    """
+    Precomputed results of a data source for a set of dynamic filters. Snapshots are refreshed by the
+    reportcraft_refresh management command and used to serve data while they are fresh.
+    """
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+    source = models.ForeignKey(DataSource, on_delete=models.CASCADE, related_name='snapshots')
+    key = models.CharField(max_length=64)
+    filters = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    data = models.BinaryField(default=b'')
+    size = models.PositiveIntegerField(default=0)
+    marker = models.JSONField(null=True, blank=True, encoder=ExactJSONEncoder)
+    duration = models.FloatField(default=0.0)
+
+    class Meta:
+        verbose_name = 'Data Source Snapshot'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'key'], name='unique_source_snapshot'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} - {self.key[:8]}'
+
+    @staticmethod
+    def make_key(filters: dict) -> str:
+        """
+        Generate a stable key for a set of dynamic filters. Values are compared as strings, since filters from
+        query parameters are always strings while snapshot filters may be declared with typed values.
+        :param filters: cleaned dynamic filters
+        """
+        text = json.dumps({key: str(value) for key, value in filters.items()}, sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def get_data(self) -> list[dict]:
+        """
+        Decompress the rows of the snapshot
+        """
+        if not self.data:
+            return []
+        names, rows = pickle.loads(zlib.decompress(self.data))
+        return [dict(zip(names, row)) for row in rows]
+
+    def set_data(self, data: list[dict]):
+        """
+        Compress and store rows in the snapshot. Rows are stored as tuples of values sharing one list of field names.
+        :param data: list of dictionaries
+        """
+        names = list(dict.fromkeys(key for item in data for key in item))
+        rows = [tuple(item.get(name) for name in names) for item in data]
+        self.data = zlib.compress(pickle.dumps((names, rows), protocol=pickle.HIGHEST_PROTOCOL))
+        self.size = len(data)
+
+
 class DataModel(models.Model):
     """
     Model definition for DataModel. This model is used to define allowed data models
@@ -291,6 +664,13 @@ class DataModel(models.Model):
             return {name: fields.get(name, None) for name in group_names}
         return {}
 
+    def get_field_names(self) -> list[str]:
+        """
+        Get the names of all fields of the underlying model
+        """
+        model: Any = apps.get_model(self.name)
+        return [f.name for f in model._meta.get_fields()]
+
     def has_field(self, field_name: str) -> bool:
         """
         Check if the underlying model has a field with the given name
@@ -373,9 +753,8 @@ class DataField(models.Model):
         return self.label
 
     def get_expression(self):
-        parser = utils.ExpressionParser()
         if self.expression:
-            db_expression = parser.parse(self.expression)
+            db_expression = utils.parse_expression(self.expression)
             if isinstance(db_expression, reportcraft.functions.DisplayName):
                 db_expression = reportcraft.functions.ChoiceName(self.model.name, db_expression.name)
             if self.precision is not None:
@@ -397,6 +776,7 @@ class Report(models.Model):
     theme = models.CharField(max_length=20, choices=Themes.choices, default=Themes.DEFAULT)
     notes = models.TextField(default='', blank=True)
     section = models.SlugField(max_length=100, default='', blank=True, null=True)
+    cache_control = models.CharField(_("Cache Control"), max_length=200, default='', blank=True)
 
     objects = CodeManager()
 
@@ -490,12 +870,19 @@ class Entry(models.Model):
     }
 
     def get_filters(self):
-        parser = utils.FilterParser()
         if self.filters:
-            return parser.parse(self.filters, silent=True)
+            return utils.parse_filters(self.filters, silent=True)
         else:
             return Q()
 
+    def get_fields(self) -> list[str] | None:
+        """
+        Get the names of the data source fields used by this entry
+        :return: a sorted list of field names or None if the entry may use all fields
+        """
+        fields = entries.get_entry_fields(self)
+        return None if fields is None else sorted(fields)
+
     def generate(self, **kwargs):
         try:
             generator = self.GENERATORS.get(self.kind, None)
@@ -0,0 +1,483 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterable
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from django.db.models import Q
+
+from . import caching, utils
+
+logger = logging.getLogger('reportcraft')
+
+PLAN_TIMEOUT = 86400
+VERSION_KEY = 'reportcraft:source-version:{}'
+DATA_VERSION_KEY = 'reportcraft:data-version:{}'
+DEFINITIONS_KEY = 'reportcraft:definitions'
+PLAN_FORMAT = 2                     # bump when the attributes of SourcePlan change, plans cached before are ignored
+PLAN_KEY = 'reportcraft:source-plan:{}:{}:{}'
+DEPENDENTS_CHECK_INTERVAL = 30      # seconds between checks of the dependency index against other processes
+
+_plans: dict[int, tuple[str, SourcePlan]] = {}
+_plans_lock = threading.Lock()
+_dependents: dict[str, Any] = {'version': None, 'checked': 0.0, 'index': {}}
+_pending = threading.local()
+_versions: dict[int, tuple[float, str]] = {}
+
+
+class ModelPlan:
+    """
+    The compiled query details for a single model of a data source.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.field_names: list[str] = []
+        self.annotations: dict[str, Any] = {}
+        self.aggregations: dict[str, Any] = {}
+
+    def get_field_names(self, fields: set[str] | None = None) -> list[str]:
+        """
+        Get the names of the fields to select from this model. All fields are selected if the projected fields
+        do not include any field from this model, so that the number of rows is not affected.
+        :param fields: the set of fields to include or None for all fields
+        """
+        if fields is None:
+            return list(self.field_names)
+        return [name for name in self.field_names if name in fields] or list(self.field_names)
+
+    def get_annotations(self, fields: set[str] | None = None) -> dict[str, Any]:
+        return {k: v for k, v in self.annotations.items() if fields is None or k in fields}
+
+    def get_aggregations(self, fields: set[str] | None = None) -> dict[str, Any]:
+        return {k: v for k, v in self.aggregations.items() if fields is None or k in fields}
+
+
+class SourcePlan:
+    """
+    A compiled representation of a data source definition. Holds everything needed to build the querysets for the
+    source without touching the DataField and DataModel tables again.
+    """
+
+    def __init__(self, source):
+        """
+        :param source: the DataSource instance to compile
+        """
+        fields = list(source.fields.select_related('model'))
+
+        self.source_id = source.pk
+        self.group_by = list(source.group_by or [])
+        self.limit = source.limit
+        self.filters = source.get_filters()
+        self.labels = {field.name: field.label for field in fields}
+        self.precisions = {
+            field.name: field.precision if field.precision is not None else 0 for field in fields
+        }
+        self.valid_filters = set(self.labels.keys())
+        self.order_by = [
+            f'-{field.name}' if field.ordering < 0 else field.name
+            for field in sorted(
+                (field for field in fields if field.ordering is not None), key=lambda field: abs(field.ordering)
+            )
+        ]
+
+        self.dependencies: dict[str, set[str]] = {}
+        self.aggregates: set[str] = set()
+        self.multi_valued: set[str] = set()     # fields following to-many relations, which affect the row count
+        self.models: dict[str, ModelPlan] = {}
+        self.model_labels: set[str] = set()         # labels of all Django models the source reads from
+        model_fields = {}
+        for field in fields:
+            model_name = field.model.name
+            model = apps.get_model(model_name)
+            if model_name not in self.models:
+                self.models[model_name] = ModelPlan(model_name)
+                model_fields[model_name] = set(field.model.get_field_names())
+                self.model_labels |= get_model_labels(model, utils.get_referenced_paths(self.filters))
+            model_plan = self.models[model_name]
+            model_plan.field_names.append(field.name)
+            if field.name in model_fields[model_name]:
+                self.model_labels |= get_model_labels(model, [field.name])
+                if utils.is_multi_valued(model, field.name):
+                    self.multi_valued.add(field.name)
+                continue
+            expression = field.get_expression()
+            paths = utils.get_referenced_paths(expression)
+            self.model_labels |= get_model_labels(model, paths)
+            if any(utils.is_multi_valued(model, path) for path in paths):
+                self.multi_valued.add(field.name)
+            if getattr(expression, 'contains_aggregate', False) or getattr(expression, 'contains_over_clause', False):
+                self.aggregates.add(field.name)
+            if not self.group_by or field.name in self.group_by:
+                model_plan.annotations[field.name] = expression
+            else:
+                model_plan.aggregations[field.name] = expression
+            self.dependencies[field.name] = (
+                utils.get_referenced_fields(expression) & self.valid_filters
+            ) - {field.name}
+
+    @property
+    def model_names(self) -> list[str]:
+        return list(self.models.keys())
+
+    def is_single_model(self) -> bool:
+        return len(self.models) == 1
+
+    def can_push_down(self) -> bool:
+        """
+        Check if ordering and limits requested by entries can be applied by the database. This is only possible for
+        single-model sources without a limit of their own, since the limit of the source must apply first.
+        """
+        return self.is_single_model() and not self.limit
+
+    def can_aggregate(self, *field_names: str) -> bool:
+        """
+        Check if the given fields can be aggregated further by the database. This requires a single-model source
+        without grouping or a limit, and fields which are not aggregates or window functions themselves.
+        :param field_names: names of the fields to aggregate or group by
+        """
+        return self.can_push_down() and not self.group_by and all(
+            name in self.valid_filters and name not in self.aggregates for name in field_names
+        )
+
+    def get_ordering(self, field_name: str, descending: bool = False) -> list[str]:
+        """
+        Get the ordering to sort by a given field, the default ordering of the source is used to break ties.
+        :param field_name: the name of the field to sort by
+        :param descending: sort in descending order
+        """
+        return [f'-{field_name}' if descending else field_name] + [
+            name for name in self.order_by if name.lstrip('-') != field_name
+        ]
+
+    def get_model(self, model_name: str) -> ModelPlan:
+        """
+        Get the compiled plan for a given model, an empty plan is returned for unknown models
+        :param model_name: the name of the model
+        """
+        return self.models.get(model_name, ModelPlan(model_name))
+
+    def get_fields(
+            self,
+            fields: Iterable[str] | None,
+            filters: dict = None,
+            select: Q = None,
+            order_by: list = None
+    ) -> set[str] | None:
+        """
+        Determine the fields which must be fetched to provide the requested fields. Group-by fields, fields used for
+        filtering or ordering, fields following to-many relations and fields referenced by the expressions of
+        required fields are always included.
+        :param fields: the requested field names or None for all fields
+        :param filters: dynamic filters
+        :param select: additional Q object used to select a subset of data
+        :param order_by: order by fields
+        :return: a set of field names or None for all fields
+        """
+        if fields is None:
+            return None
+
+        # Fields following to-many relations are always fetched, leaving out their joins would change the number
+        # of rows, and the values of aggregates computed alongside them.
+        required = set(fields) | set(self.group_by) | self.multi_valued
+        required |= {name.lstrip('-') for name in (order_by or self.order_by)}
+        required |= {name.split('__')[0] for name in self.clean_filters(filters or {})}
+        required |= utils.get_referenced_fields(self.filters) | utils.get_referenced_fields(select)
+        required &= self.valid_filters
+
+        pending = list(required)
+        while pending:
+            for name in self.dependencies.get(pending.pop(), ()):
+                if name not in required:
+                    required.add(name)
+                    pending.append(name)
+        return required
+
+    def clean_filters(self, filters: dict) -> dict:
+        """
+        Clean the filters to ensure they only contain valid field names defined in the data source
+        :param filters: dictionary of filters
+        :return: cleaned filters
+        """
+        return {
+            k: v for k, v in filters.items()
+            if k.split('__')[0] in self.valid_filters and k.count('__') < 2       # Only allow one level of lookups
+        }
+
+    def get_filters(self) -> Q:
+        return self.filters
+
+
+def get_model_labels(model, paths: Iterable[str] = ()) -> set[str]:
+    """
+    Get the labels of a model and the models reached through the relations of lookup paths from it. Concrete models
+    are used in place of proxies, and the parents of models using multi-table inheritance are included.
+    :param model: the model to start from
+    :param paths: lookup paths, only the model itself is included if empty
+    """
+    labels = set()
+    for related in {model}.union(*(utils.get_related_models(model, path) for path in paths)):
+        related = related._meta.concrete_model
+        labels |= {parent._meta.label_lower for parent in [related, *related._meta.get_parent_list()]}
+    return labels
+
+
+def new_version() -> str:
+    """
+    Create a unique version string, prefixed with the current time, see get_version_time
+    """
+    return f'{time.time():.3f}-{uuid.uuid4().hex}'
+
+
+def get_version_time(version: str) -> float:
+    """
+    Get the latest time at which the parts of a version string, such as one returned by get_cache_version, were
+    created.
+    :param version: the version string
+    :return: a POSIX timestamp, 0 if unknown
+    """
+    times = []
+    for part in version.split(':'):
+        try:
+            times.append(float(part.split('-')[0]))
+        except ValueError:
+            pass
+    return max(times, default=0.0)
+
+
+def get_version(source_id: int) -> str:
+    """
+    Get the current definition version of a data source, creating one if it does not exist.
+    :param source_id: the primary key of the data source
+    """
+    key = VERSION_KEY.format(source_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key, '')
+    return version
+
+
+def invalidate(source_id: int | None):
+    """
+    Invalidate the compiled plan of a data source by bumping its definition version.
+    :param source_id: the primary key of the data source
+    """
+    if source_id is None:
+        return
+    cache.set_many({
+        VERSION_KEY.format(source_id): new_version(),
+        DEFINITIONS_KEY: new_version(),
+    }, timeout=None)
+    _versions.pop(source_id, None)
+    with _plans_lock:
+        _plans.pop(source_id, None)
+        _dependents['checked'] = 0.0
+
+
+def get_plan(source) -> SourcePlan:
+    """
+    Fetch the compiled plan for a data source. Plans are built once per definition version and are kept
+    in-process as well as in the shared cache. Within a render context, the version is only checked once.
+    :param source: the DataSource instance
+    """
+    memo = utils.get_render_memo()
+    if memo is None:
+        return load_plan(source)
+
+    # stored in the memo directly, so that RenderMemo.hits only counts saved data fetches
+    key = ('plan', source.pk)
+    if key not in memo.values:
+        memo.values[key] = load_plan(source)
+    return memo.values[key]
+
+
+def load_plan(source) -> SourcePlan:
+    """
+    Load the compiled plan for the current definition version of a data source, see get_plan.
+    :param source: the DataSource instance
+    """
+    version = get_version(source.pk)
+    entry = _plans.get(source.pk)
+    if entry and entry[0] == version:
+        return entry[1]
+
+    key = PLAN_KEY.format(PLAN_FORMAT, source.pk, version)
+    plan = cache.get(key)
+    if plan is None:
+        plan = SourcePlan(source)
+        try:
+            cache.set(key, plan, timeout=PLAN_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Unable to cache plan for source {source.pk}: {e}")
+
+    with _plans_lock:
+        _plans[source.pk] = (version, plan)
+    return plan
+
+
+def get_data_version(source_id: int) -> str:
+    """
+    Get the current data version of a data source, which changes whenever rows of the models it reads change.
+    :param source_id: the primary key of the data source
+    """
+    key = DATA_VERSION_KEY.format(source_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key, '')
+    return version
+
+
+def get_cache_version(source_id: int) -> str:
+    """
+    Get a version string for cached results of a data source, combining its definition and data versions. Within a
+    render context, the versions are only fetched once. When the local cache is enabled, versions are only fetched
+    from the shared cache every REPORTCRAFT_LOCAL_CACHE_CHECK seconds, or after they are changed by this process.
+    :param source_id: the primary key of the data source
+    """
+    memo = utils.get_render_memo()
+    memo_key = ('cache-version', source_id)
+    if memo is not None and memo_key in memo.values:
+        return memo.values[memo_key]
+
+    checked = _versions.get(source_id)
+    if checked and caching.local_cache.max_size and time.monotonic() - checked[0] < caching.LOCAL_CACHE_CHECK:
+        version = checked[1]
+    else:
+        version = fetch_cache_version(source_id)
+        _versions[source_id] = (time.monotonic(), version)
+    if memo is not None:
+        memo.values[memo_key] = version
+    return version
+
+
+def fetch_cache_version(source_id: int) -> str:
+    """
+    Fetch the version string for cached results of a data source from the shared cache, see get_cache_version
+    :param source_id: the primary key of the data source
+    """
+    keys = (VERSION_KEY.format(source_id), DATA_VERSION_KEY.format(source_id))
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        versions = {keys[0]: get_version(source_id), keys[1]: get_data_version(source_id)}
+    return ':'.join(versions[key] for key in keys)
+
+
+def get_dependents(label: str) -> set[int]:
+    """
+    Get the data sources which read from a model. The index of dependencies is built from the plans of all sources
+    and is rebuilt when a source definition changes, in this or another process.
+    :param label: the lower-case label of the model, e.g. 'example.person'
+    """
+    now = time.monotonic()
+    if now - _dependents['checked'] > DEPENDENTS_CHECK_INTERVAL:
+        from .models import DataSource
+
+        version = cache.get(DEFINITIONS_KEY)
+        if version is None:
+            cache.add(DEFINITIONS_KEY, new_version(), timeout=None)
+            version = cache.get(DEFINITIONS_KEY)
+        if version != _dependents['version']:
+            index = defaultdict(set)
+            try:
+                # a savepoint keeps the caller's transaction usable if the query fails
+                with transaction.atomic(using=DataSource.objects.db):
+                    for source in DataSource.objects.all():
+                        for model_label in get_plan(source).model_labels:
+                            index[model_label].add(source.pk)
+            except DatabaseError as e:
+                # tables or columns may not exist yet, e.g. during migrations. The index is not marked as checked,
+                # so it is built on the next change instead of after the check interval.
+                logger.debug(f"Unable to build dependency index: {e}")
+                return set()
+            with _plans_lock:
+                _dependents.update(version=version, index=dict(index))
+        _dependents['checked'] = now
+    return _dependents['index'].get(label, set())
+
+
+def bump_data_versions(source_ids: Iterable[int]):
+    """
+    Change the data versions of data sources, invalidating all of their cached results.
+    :param source_ids: primary keys of the data sources
+    """
+    versions = {}
+    for source_id in source_ids:
+        versions[DATA_VERSION_KEY.format(source_id)] = new_version()
+        _versions.pop(source_id, None)
+    if versions:
+        cache.set_many(versions, timeout=None)
+
+
+def invalidate_models(labels: Iterable[str], using: str = DEFAULT_DB_ALIAS):
+    """
+    Invalidate the cached results of all data sources reading from the given models. Within a transaction, the
+    data versions are changed once after the transaction commits. Within a defer_invalidation context, they are
+    changed once when the context exits.
+    :param labels: lower-case labels of the changed models
+    :param using: the database alias the changes were written to
+    """
+    source_ids = set().union(*(get_dependents(label) for label in labels))
+    if not source_ids:
+        return
+
+    deferred = getattr(_pending, 'deferred', None)
+    if deferred is not None:
+        deferred |= source_ids
+    elif transaction.get_connection(using).in_atomic_block:
+        committed = getattr(_pending, 'committed', None)
+        if committed is None:
+            _pending.committed = committed = set()
+        # Only the first change in the transaction registers the callback. The pending sources are kept when a
+        # transaction is rolled back, which discards the callback, and are then flushed with the next transaction.
+        if not committed or not is_flush_pending(using):
+            transaction.on_commit(flush_invalidations, using=using)
+        committed |= source_ids
+    else:
+        bump_data_versions(source_ids)
+
+
+def is_flush_pending(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Check if flush_invalidations is registered to run when the current transaction commits
+    :param using: the database alias
+    """
+    return any(item[1] is flush_invalidations for item in transaction.get_connection(using).run_on_commit)
+
+
+def flush_invalidations():
+    """
+    Change the data versions of data sources invalidated by a committed transaction. The callback is registered by
+    the first change made in the transaction.
+    """
+    source_ids, _pending.committed = getattr(_pending, 'committed', set()), set()
+    if source_ids:
+        bump_data_versions(source_ids)
+
+
+@contextmanager
+def defer_invalidation():
+    """
+    Collect invalidations of data sources during bulk writes and apply them once when the context exits, e.g.
+
+        with defer_invalidation():
+            for item in items:
+                item.save()
+    """
+    outer = getattr(_pending, 'deferred', None)
+    _pending.deferred = set() if outer is None else outer
+    try:
+        yield
+    finally:
+        source_ids = _pending.deferred
+        _pending.deferred = outer
+        if outer is None:
+            bump_data_versions(source_ids)
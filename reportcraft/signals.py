@@ -0,0 +1,35 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import plans
+from .models import DataSource, DataModel, DataField
+
+
+@receiver(post_save, sender=DataSource)
+@receiver(post_delete, sender=DataSource)
+def source_changed(sender, instance, **kwargs):
+    plans.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=DataModel)
+@receiver(post_delete, sender=DataModel)
+@receiver(post_save, sender=DataField)
+@receiver(post_delete, sender=DataField)
+def source_definition_changed(sender, instance, **kwargs):
+    plans.invalidate(instance.source_id)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def model_data_changed(sender, instance, using=None, raw=False, **kwargs):
+    if raw or sender._meta.app_label == 'reportcraft':
+        return
+    plans.invalidate_models(plans.get_model_labels(sender), using=using)
+
+
+@receiver(m2m_changed)
+def relation_data_changed(sender, instance, action, model=None, using=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    changed = [sender, type(instance)] + ([model] if model is not None else [])
+    plans.invalidate_models(set().union(*(plans.get_model_labels(item) for item in changed)), using=using)
@@ -182,6 +182,28 @@ function Likert(responses) {
     };
 }
 
+export function decodeColumnar(data) {
+    // expand data in the columnar format, {columns: [...], values: [[...], ...]}, into a list of row objects
+    if (!data || !Array.isArray(data.columns) || !Array.isArray(data.values)) {
+        return data;
+    }
+    const columns = data.columns.map(function (column, i) {
+        const values = data.values[i];
+        switch (column.type) {
+            case 'category':
+                return values.map(value => (value === null) ? null : column.categories[value]);
+            case 'date':
+                return values.map(value => (value === null) ? null : new Date(value));
+            default:
+                return values;
+        }
+    });
+    const size = (columns.length > 0) ? columns[0].length : 0;
+    return Array.from({length: size}, function (_, row) {
+        return Object.fromEntries(data.columns.map((column, i) => [column.name, columns[i][row]]));
+    });
+}
+
 export function showReport(selector, sections, staticRoot = "/static/reportcraft/") {
     const target = document.querySelector(selector);
 
@@ -191,6 +213,15 @@ export function showReport(selector, sections, staticRoot = "/static/reportcraft
     }
     target.classList.add('report-viewer');          // add main class to the container
 
+    // expand entry data sent in the columnar format
+    sections.forEach(function (section) {
+        (section.content || []).forEach(function (entry) {
+            if (entry && entry.data) {
+                entry.data = decodeColumnar(entry.data);
+            }
+        });
+    });
+
     // add sections to the container, we'll fill the content in a second pass
     sections.forEach(function (section, i) {
         const sectionHTML = renderSection({
@@ -761,10 +792,30 @@ function drawHistogram(figure, chart, options) {
             binOutput.mixBlendMode = "multiply";
         }
     }
-    plotOptions.marks = [
-        Plot.rectY(chart.data, Plot.binX(binInput, binOutput)),
-        Plot.ruleY([0])
-    ];
+    if (chart.binned) {
+        // Pre-binned on the server, expand the bin edges and counts of each group into rectangles
+        const edges = chart.bins;
+        const rects = chart.data.flatMap(series => series.counts.map((count, i) => ({
+            x1: edges[i], x2: edges[i + 1], count: count, group: series.group
+        })));
+        const rectOptions = {x1: "x1", x2: "x2", y: "count"};
+        plotOptions.x = {label: chart.values};
+        if (chart["groups"]) {
+            rectOptions.fill = "group";
+            if (!(chart.stack)) {
+                rectOptions.y = undefined;
+                rectOptions.y1 = 0;
+                rectOptions.y2 = "count";
+                rectOptions.mixBlendMode = "multiply";
+            }
+        }
+        plotOptions.marks = [Plot.rectY(rects, rectOptions), Plot.ruleY([0])];
+    } else {
+        plotOptions.marks = [
+            Plot.rectY(chart.data, Plot.binX(binInput, binOutput)),
+            Plot.ruleY([0])
+        ];
+    }
 
     // Create chart
     const plot = Plot.plot(plotOptions);
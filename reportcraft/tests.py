@@ -1,8 +1,34 @@
-from django.test import TestCase
-from reportcraft.utils import ExpressionParser, FilterParser
+import csv
+import io
+import json
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import numpy
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from reportcraft.datasets import Dataset, COLUMNAR_MEDIA_TYPE, encode_column
+from reportcraft.encoders import JSONSerializer, OrjsonSerializer
+from reportcraft.models import DataSource, DataModel, DataField, Entry, Report
+from reportcraft import caching, encoders, plans, utils
+from reportcraft.caching import cached_model_method
+from reportcraft.plans import SourcePlan
+from reportcraft.utils import ExpressionParser, FilterParser, parse_expression, parse_filters, merge_data, make_cache_key
 from django.db.models import *
 from django.db.models.functions import *
 
+from demo.example.models import Country, Institution, Person, Subject
+
 
 EXPRESSIONS = {
     "Published.Year": F('published__year'),
@@ -95,4 +121,797 @@ class UtilsTestCase(TestCase):
         except ValueError:
             self.fail(f"Unexpected ValueError for silent parsing: `{expr1}`")
         else:
-            self.assertEqual(result1, Q(), f"Invalid return value:`{expr1}`, {result1!r}")
\ No newline at end of file
+            self.assertEqual(result1, Q(), f"Invalid return value:`{expr1}`, {result1!r}")
+
+    def test_cached_parsers(self):
+        for expression, expected in EXPRESSIONS.items():
+            result = parse_expression(expression)
+            self.assertTrue(compare_expressions(result, expected), f"Failed for expression:`{expression}`")
+            self.assertIs(result, parse_expression(expression))
+        for expression, expected in FILTERS.items():
+            self.assertEqual(parse_filters(expression), expected, f"Failed for filter:`{expression}`")
+        self.assertEqual(parse_filters('Citations + 100', silent=True), Q())
+        with self.assertRaises(ValueError):
+            parse_filters('Citations + 100')
+
+    def test_merge_data(self):
+        data = [
+            {'year': 10, 'a': 1}, {'year': 9, 'a': 2}, {'year': None, 'a': 3},
+            {'year': 9, 'b': 4}, {'year': 10, 'b': 5, 'a': 6},
+        ]
+        merged = merge_data(data, unique=['year'], sort=False)
+        self.assertEqual(merged, [{'year': 10, 'a': 6, 'b': 5}, {'year': 9, 'a': 2, 'b': 4}, {'year': None, 'a': 3}])
+        self.assertEqual(data[0], {'year': 10, 'a': 1})
+        merged = merge_data(data, unique=['year'])
+        self.assertEqual([item['year'] for item in merged], [None, 9, 10])
+        keys = [('b', 2), (None, 1), ('a', 10), ('a', 9)]
+        merged = merge_data([{'name': name, 'n': n} for name, n in keys], unique=['name', 'n'])
+        self.assertEqual([(item['name'], item['n']) for item in merged], [(None, 1), ('a', 9), ('a', 10), ('b', 2)])
+
+    SERIALIZER_PAYLOAD = {
+        'data': [{'avg': Decimal('1.50'), 'day': date(2024, 1, 2), 'count': numpy.int64(3)}],
+        'values': numpy.arange(3),
+    }
+    SERIALIZED = {'data': [{'avg': 1.5, 'day': '2024-01-02', 'count': 3}], 'values': [0, 1, 2]}
+
+    def test_json_serializers(self):
+        self.assertEqual(json.loads(JSONSerializer().dumps(self.SERIALIZER_PAYLOAD)), self.SERIALIZED)
+        self.assertEqual(encode_column([Decimal('1.5'), None, 2]), ({}, [1.5, None, 2.0]))
+        self.assertEqual(encode_column([date(1970, 1, 2), None]), ({'type': 'date'}, [86400000, None]))
+
+    @skipUnless(encoders.orjson, "orjson is not installed")
+    def test_orjson_serializer(self):
+        self.assertEqual(json.loads(OrjsonSerializer().dumps(self.SERIALIZER_PAYLOAD)), self.SERIALIZED)
+
+    def test_cache_keys(self):
+        equivalent = [
+            Q(type='user') & (Q(age__gt=30) & Q(gender='male')),
+            Q(gender__exact='male') & Q(age__gt=30) & Q(type='user'),
+            Q(age__gt=30, gender='male', type='user'),
+        ]
+        self.assertEqual(len({make_cache_key(select) for select in equivalent}), 1)
+        self.assertEqual(make_cache_key({'a': 1, 'b': [1, 2]}), make_cache_key({'b': [1, 2], 'a': 1}))
+        self.assertEqual(make_cache_key(Q()), make_cache_key(None))
+        different = [
+            Q(type='user') | (Q(age__gt=30) & Q(gender='male')),
+            ~Q(type='user') & Q(age__gt=30) & Q(gender='male'),
+            Q(age__gt=31, gender='male', type='user'),
+            Q(age__gt='30', gender='male', type='user'),
+        ]
+        self.assertEqual(len({make_cache_key(select) for select in equivalent + different}), 5)
+
+
+class CachedCounter:
+    def __init__(self, pk):
+        self.id = pk
+        self.calls = 0
+
+    @cached_model_method(duration=60)
+    def double(self, value):
+        time.sleep(0.2)
+        self.calls += 1
+        return value * 2
+
+
+class CachingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def call_concurrently(self, func, count=8):
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(lambda i: func(), range(count)))
+
+    def test_single_flight(self):
+        counter = CachedCounter(1)
+        self.assertEqual(self.call_concurrently(lambda: counter.double(21)), [42] * 8)
+        self.assertEqual(counter.calls, 1)
+
+    def test_stale_while_revalidate(self):
+        counter = CachedCounter(2)
+        key = make_cache_key('CachedCounter', 2, 'double', None, (21,), {})
+        caching.store(key, 'stale', duration=-60)
+        self.assertEqual(self.call_concurrently(lambda: counter.double(21)), ['stale'] * 8)
+        caching._inflight[key].result()
+        self.assertEqual(counter.calls, 1)
+        self.assertEqual(counter.double(21), 42)
+
+        caching.store(key, 'stale', duration=-60)
+        cache.add(f'{key}:lock', 1)   # refreshed by another process
+        self.assertEqual(self.call_concurrently(lambda: counter.double(21)), ['stale'] * 8)
+        self.assertEqual(counter.calls, 1)
+
+    def test_serializer(self):
+        records = [{'name': f'Name {i % 10}', 'count': i, 'total': i / 3} for i in range(5000)]
+        serializer = caching.ColumnarSerializer(compression='zlib', threshold=1024)
+        data, raw_size = serializer.encode(records)
+        self.assertEqual(serializer.loads(data), records)
+        self.assertLess(len(data), raw_size)
+        self.assertLess(raw_size, len(pickle.dumps(records)))
+        mixed = [{'a': 1}, {'b': 2}]
+        self.assertEqual(serializer.loads(serializer.dumps(mixed)), mixed)
+        lzma = caching.ColumnarSerializer(compression='lzma', threshold=0)
+        self.assertEqual(lzma.loads(lzma.dumps(records)), records)
+
+    def test_chunked_values(self):
+        records = [{'name': f'Name {i}', 'count': i} for i in range(2000)]
+        stored = caching.stats.chunked
+        with mock.patch.object(caching, 'CACHE_ITEM_SIZE', 1024):
+            caching.store('chunked', records, duration=60)
+            self.assertEqual(caching.load('chunked')[1], records)
+            self.assertEqual(caching.stats.chunked, stored + 1)
+            cache.delete('chunked:1')
+            self.assertIsNone(caching.load('chunked'))
+
+
+class QueryPoolTestCase(TransactionTestCase):
+    def test_parallel_queries(self):
+        Country.objects.create(name='Canada', code='CAN')
+        Country.objects.create(name='Mexico', code='MEX')
+
+        def query(delay, code):
+            def func():
+                time.sleep(delay)
+                return threading.current_thread().name, Country.objects.filter(code=code).count()
+            return func
+
+        with override_settings(REPORTCRAFT_QUERY_WORKERS=2):
+            executor = utils.get_query_executor()
+            self.assertIs(utils.get_query_executor(), executor)
+            with override_settings(REPORTCRAFT_QUERY_WORKERS=3):
+                self.assertIsNot(utils.get_query_executor(), executor)
+            with override_settings(REPORTCRAFT_QUERY_WORKERS=1):
+                self.assertIsNone(utils.get_query_executor())
+
+            results = utils.run_queries([query(0.05, 'CAN'), query(0, 'MEX'), query(0, 'USA')])
+            self.assertEqual([count for name, count in results], [1, 1, 0])
+            self.assertTrue(all(name.startswith('reportcraft-query') for name, count in results))
+
+            def failing():
+                raise ValueError('query failed')
+
+            with self.assertRaisesMessage(ValueError, 'query failed'):
+                utils.run_queries([query(0, 'CAN'), failing])
+
+
+def create_source(name, model_name, fields, group_by=None, **kwargs):
+    """
+    Create a data source with a single model and the given fields
+    :param name: name of the data source
+    :param model_name: name of the model, e.g. 'example.Person'
+    :param fields: list of (name, expression, extra) tuples for the fields
+    :param group_by: list of group by field names
+    """
+    app_label, model = model_name.lower().split('.')
+    source = DataSource.objects.create(name=name, group_by=group_by or [], **kwargs)
+    data_model = DataModel.objects.create(
+        source=source, name=model_name, model=ContentType.objects.get(app_label=app_label, model=model)
+    )
+    for i, (field_name, expression, extra) in enumerate(fields):
+        DataField.objects.create(
+            source=source, model=data_model, name=field_name, label=field_name.replace('_', ' ').title(),
+            expression=expression, position=i, **extra
+        )
+    return source
+
+
+class DataTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with plans.defer_invalidation():
+            cls.create_data()
+
+    @classmethod
+    def create_data(cls):
+        country = Country.objects.create(name='Canada', code='CAN')
+        institutions = [
+            Institution.objects.create(name=f'Institution {i}', city='Saskatoon', country=country)
+            for i in range(3)
+        ]
+        for i in range(12):
+            Person.objects.create(
+                first_name=f'First{i}', last_name=f'Last{i}', gender='male' if i % 2 else 'female',
+                age=20 + i * 3, bio='', type=['admin', 'user', 'guest'][i % 3], institution=institutions[i % 3]
+            )
+        cls.people = create_source('People', 'example.Person', [
+            ('first_name', '', {}),
+            ('age', '', {'ordering': -1}),
+            ('type', '', {}),
+            ('institution_name', 'Institution.Name', {}),
+        ])
+        cls.types = create_source('Types', 'example.Person', [
+            ('type', '', {}),
+            ('count', 'Count(this)', {}),
+            ('avg_age', 'Avg(Age)', {'precision': 1}),
+        ], group_by=['type'])
+
+    def setUp(self):
+        cache.clear()
+        plans._pending.committed = set()
+
+
+class SourcePlanTestCase(DataTestCase):
+    def test_plan_contents(self):
+        plan = self.people.get_plan()
+        self.assertEqual(plan.model_names, ['example.Person'])
+        self.assertEqual(plan.order_by, ['-age'])
+        self.assertEqual(list(plan.get_model('example.Person').annotations), ['institution_name'])
+        self.assertEqual(plan.labels['institution_name'], 'Institution Name')
+
+        plan = self.types.get_plan()
+        self.assertEqual(list(plan.get_model('example.Person').aggregations), ['count', 'avg_age'])
+        self.assertEqual(plan.precisions['avg_age'], 1)
+
+    def test_plan_reused(self):
+        source = DataSource.objects.get(pk=self.types.pk)
+        source.get_data()
+        with self.assertNumQueries(0):
+            source.get_labels()
+            source.get_precision('avg_age')
+            source.clean_filters({'type': 'user'})
+        with self.assertNumQueries(1):
+            source.get_source_data()
+
+    def test_plan_invalidation(self):
+        plan = self.types.get_plan()
+        self.assertIs(plan, self.types.get_plan())
+        field = self.types.fields.get(name='count')
+        field.label = 'Total'
+        field.save()
+        self.assertIsNot(plan, self.types.get_plan())
+        self.assertEqual(self.types.get_labels()['count'], 'Total')
+
+
+class DataVersionTestCase(DataTestCase):
+    def test_model_changes_invalidate(self):
+        version = self.people.get_cache_version()
+        types_version = self.types.get_cache_version()
+        self.assertEqual(len(self.people.get_data()), 12)
+        person = Person.objects.get(first_name='First0')
+        person.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            person.save()
+        self.assertNotEqual(self.people.get_cache_version(), version)
+        self.assertNotEqual(self.types.get_cache_version(), types_version)
+        self.assertIn('Renamed', [item['first_name'] for item in self.people.get_data()])
+
+        self.people.get_data(select=Q(type='user') & Q(age__gt=30), order_by=['age'])
+        with self.assertNumQueries(0):
+            self.people.get_data(select=Q(age__gt=30, type='user'), order_by=['age'])
+
+        version = self.people.get_cache_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(name='Mexico', code='MEX')
+        self.assertEqual(self.people.get_cache_version(), version)      # not a model of the source
+
+        Institution.objects.filter(pk=person.institution_id).update(name='Changed')
+        self.assertEqual(self.people.get_cache_version(), version)      # updates bypass signals
+
+    def test_local_cache(self):
+        with mock.patch.object(caching, 'local_cache', caching.LocalCache(10 ** 7)):
+            data = self.people.get_data()
+            hits = caching.metrics['local'].hits
+            with mock.patch.object(cache, 'get', side_effect=AssertionError), \
+                    mock.patch.object(cache, 'get_many', side_effect=AssertionError):
+                self.assertEqual(self.people.get_data(), data)
+            self.assertEqual(caching.metrics['local'].hits, hits + 1)
+
+            person = Person.objects.get(first_name='First0')
+            person.first_name = 'Renamed'
+            with self.captureOnCommitCallbacks(execute=True):
+                person.save()
+            self.assertIn('Renamed', [item['first_name'] for item in self.people.get_data()])
+
+        local_cache = caching.LocalCache(100)
+        for i in range(4):
+            local_cache.set(f'key{i}', 0, i, 30)
+        local_cache.get('key1')
+        local_cache.set('large', 0, 'large', 200)
+        self.assertEqual(list(local_cache.entries), ['key2', 'key3', 'key1'])
+        self.assertEqual(local_cache.size, 90)
+
+    def test_cache_durations(self):
+        self.assertEqual(self.people.get_compute_time(), 0)
+        self.people.get_data()
+        measured = self.people.get_compute_time()
+        self.assertGreater(measured, 0)
+        self.people.record_compute_time(measured + 1)
+        self.assertAlmostEqual(self.people.get_compute_time(), measured + caching.COMPUTE_TIME_WEIGHT)
+
+        self.people.cache_ttl = 120
+        self.assertEqual(self.people.get_cache_duration(), 120)
+        self.people.cache_policy = DataSource.CachePolicies.ADAPTIVE
+        self.assertEqual(self.people.get_cache_duration(), caching.adaptive_duration(self.people.get_compute_time()))
+        self.assertEqual(caching.adaptive_duration(0.001), caching.CACHE_MIN_DURATION)
+        self.assertEqual(caching.adaptive_duration(0.5), 0.5 * caching.CACHE_ADAPTIVE_FACTOR)
+        self.assertEqual(caching.adaptive_duration(60), caching.CACHE_MAX_DURATION)
+
+        # the duration is only needed to store a computed result
+        self.people.save()
+        data = self.people.get_data()
+        with mock.patch.object(DataSource, 'get_cache_duration', side_effect=AssertionError):
+            self.assertEqual(self.people.get_data(), data)
+
+    def test_invalidation_debounced(self):
+        version = self.people.get_cache_version()
+        with mock.patch('reportcraft.plans.bump_data_versions', wraps=plans.bump_data_versions) as bump:
+            # a rolled back change discards the callback, the next change registers it again
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        Person.objects.first().save()
+                        raise DatabaseError
+                except DatabaseError:
+                    pass
+                Person.objects.first().save()
+            self.assertEqual(callbacks, [plans.flush_invalidations])
+            self.assertNotEqual(self.people.get_cache_version(), version)
+            bump.reset_mock()
+
+            version = self.people.get_cache_version()
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                for person in Person.objects.all():
+                    person.age += 1
+                    person.save()
+                self.assertEqual(self.people.get_cache_version(), version)
+            self.assertEqual(callbacks, [plans.flush_invalidations])
+            self.assertNotEqual(self.people.get_cache_version(), version)
+            self.assertEqual(bump.call_count, 1)
+
+            with plans.defer_invalidation():
+                Person.objects.first().delete()
+                Person.objects.first().delete()
+            self.assertEqual(bump.call_count, 2)
+
+    def test_dependents_database_error(self):
+        plans._dependents.update(checked=0, version=None, index={})
+        with mock.patch.object(DataSource.objects, 'all', side_effect=DatabaseError('no such column')):
+            self.assertEqual(plans.get_dependents('example.person'), set())
+        self.assertEqual(plans._dependents['checked'], 0)
+        self.assertEqual(Person.objects.count(), 12)     # the transaction is still usable
+        self.assertIn(self.people.pk, plans.get_dependents('example.person'))
+
+
+class SourceDataTestCase(DataTestCase):
+    def test_iter_data(self):
+        for source in [self.people, self.types]:
+            self.assertEqual(list(source.iter_data(chunk_size=5)), source.get_source_data())
+        self.assertEqual(
+            list(self.people.iter_data(filters={'type': 'admin'})),
+            self.people.get_source_data(filters={'type': 'admin'})
+        )
+
+        # groups are sorted the same way whatever order the database returns them in
+        get_queryset = DataSource.get_queryset
+
+        def reversed_groups(source, *args, **kwargs):
+            return get_queryset(source, *args, **kwargs).order_by('-type')
+
+        with mock.patch.object(DataSource, 'get_queryset', reversed_groups):
+            data = list(self.types.iter_data())
+            self.assertEqual([row['type'] for row in data], ['admin', 'guest', 'user'])
+            self.assertEqual(data, self.types.get_source_data())
+
+    def test_json_export(self):
+        response = self.client.get(reverse('source-data', kwargs={'pk': self.people.pk}), {'type': 'user'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data, self.people.get_source_data(filters={'type': 'user'}))
+
+    def test_merged_iter_data(self):
+        source = create_source('Cities', 'example.Person', [
+            ('city', 'Institution.City', {}),
+            ('people', 'Count(this)', {}),
+        ], group_by=['city'])
+        data_model = DataModel.objects.create(
+            source=source, name='example.Institution',
+            model=ContentType.objects.get(app_label='example', model='institution')
+        )
+        DataField.objects.create(source=source, model=data_model, name='city', label='City', position=0)
+        DataField.objects.create(
+            source=source, model=data_model, name='institutions', label='Institutions', expression='Count(this)',
+            position=1
+        )
+        source = DataSource.objects.get(pk=source.pk)
+        expected = [{'city': 'Saskatoon', 'people': 12, 'institutions': 3}]
+        self.assertEqual(source.get_source_data(), expected)
+        self.assertEqual(list(source.iter_data(chunk_size=1)), expected)
+        self.assertEqual(list(source.iter_data(limit=1)), expected)
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('format-source-data', kwargs={'pk': self.types.pk, 'format': 'csv'}))
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(list(rows[0]), ['Type', 'Count', 'Avg Age'])
+        self.assertEqual([row['Type'] for row in rows], [row['type'] for row in self.types.get_source_data()])
+
+        response = self.client.get(
+            reverse('format-source-data', kwargs={'pk': self.types.pk, 'format': 'csv'}), {'type': 'missing'}
+        )
+        self.assertEqual(b''.join(response.streaming_content).decode().strip(), 'Type,Count,Avg Age')
+
+        def failing(**kwargs):
+            yield {'type': 'admin'}
+            raise DatabaseError('connection lost')
+
+        with mock.patch.object(DataSource, 'iter_data', side_effect=failing), \
+                self.assertLogs('reportcraft', 'ERROR'), self.assertRaises(DatabaseError):
+            response = self.client.get(reverse('format-source-data', kwargs={'pk': self.types.pk, 'format': 'csv'}))
+            b''.join(response.streaming_content)
+
+        with self.assertWarns(DeprecationWarning):
+            response = utils.CsvResponse([{'type': 'admin', 'count': 4}], headers=['type', 'count'])
+        self.assertEqual(response.content.decode().splitlines(), ['type,count', 'admin,4'])
+
+    def test_ndjson_export(self):
+        response = self.client.get(
+            reverse('format-source-data', kwargs={'pk': self.people.pk, 'format': 'ndjson'}), {'type': 'user'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.people.get_source_data(filters={'type': 'user'}))
+
+    def test_paged_export(self):
+        def fetch_all(source, **params):
+            url = reverse('source-pages', kwargs={'pk': source.pk})
+            pages = []
+            while url:
+                self.assertLess(len(pages), 20, 'pages repeat')
+                page = self.client.get(url, params).json()
+                pages.append(page['results'])
+                url, params = page['next'], {}
+            return pages
+
+        pages = fetch_all(self.people, page_size=5)
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        names = [row['first_name'] for page in pages for row in page]
+        self.assertEqual(names, list(Person.objects.order_by('pk').values_list('first_name', flat=True)))
+        self.assertNotIn('pk', pages[0][0])
+
+        pages = fetch_all(self.people, page_size=2, type='admin')
+        self.assertEqual([len(page) for page in pages], [2, 2])
+        self.assertEqual({row['type'] for page in pages for row in page}, {'admin'})
+
+        pages = fetch_all(self.types, page_size=2)
+        self.assertEqual([row['type'] for page in pages for row in page], ['admin', 'guest', 'user'])
+
+        self.people.limit = 7
+        self.people.save()
+        pages = fetch_all(self.people, page_size=5)
+        self.assertEqual(sum(pages, []), self.people.get_data())
+
+        # group keys keep their microseconds in cursors
+        for i, person in enumerate(Person.objects.all()):
+            person.created = datetime(2030, 1, 1, 12, 0, 0, 123456 + i % 4, tzinfo=dt_timezone.utc)
+            person.save()
+        created = create_source('Created', 'example.Person', [
+            ('created', '', {}), ('count', 'Count(this)', {}),
+        ], group_by=['created'])
+        pages = fetch_all(created, page_size=1)
+        self.assertEqual([len(page) for page in pages], [1, 1, 1, 1])
+        self.assertEqual(sum(row['count'] for page in pages for row in page), 12)
+
+        # rows following to-many relations repeat primary keys and are paged by offset
+        Institution.objects.first().subjects.add(*[Subject.objects.create(name=f'Subject {i}') for i in range(3)])
+        subjects = create_source('Subjects', 'example.Institution', [
+            ('name', '', {}), ('subject', 'Subjects.Name', {}),
+        ])
+        pages = fetch_all(subjects, page_size=2)
+        self.assertEqual(sum(pages, []), subjects.get_data())
+
+        url = reverse('source-pages', kwargs={'pk': self.people.pk})
+        self.assertEqual(self.client.get(url, {'cursor': 'invalid'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'page_size': 'all'}).status_code, 400)
+
+    def test_columnar_export(self):
+        url = reverse('source-data', kwargs={'pk': self.people.pk})
+        data = self.client.get(url, {'layout': 'columnar', 'type': 'user'}).json()
+        columns = {column['name']: column for column in data['columns']}
+        self.assertEqual(columns['type'], {'name': 'type', 'type': 'category', 'categories': ['user']})
+        rows = [
+            dict(zip(columns, values)) for values in zip(*[
+                [columns[name]['categories'][v] for v in column] if 'categories' in columns[name] else column
+                for name, column in zip(columns, data['values'])
+            ])
+        ]
+        self.assertEqual(rows, self.people.get_source_data(filters={'type': 'user'}))
+
+        report = Report.objects.create(slug='columnar', title='Columnar')
+        Entry.objects.create(
+            report=report, source=self.people, kind=Entry.Types.BARS, attrs={'categories': 'type', 'values': ['age']}
+        )
+        url = reverse('report-data', kwargs={'slug': report.slug})
+        entry = self.client.get(url, HTTP_ACCEPT=COLUMNAR_MEDIA_TYPE).json()['sections'][0]['content'][0]
+        self.assertEqual([column['name'] for column in entry['data']['columns']], ['Type', 'Age'])
+        self.assertCountEqual(entry['data']['columns'][0]['categories'], ['admin', 'user', 'guest'])
+        entry = self.client.get(url).json()['sections'][0]['content'][0]
+        self.assertEqual(len(entry['data']), Person.objects.count())
+
+    def test_render_memo(self):
+        report = Report.objects.create(slug='memo', title='Memo')
+        for title in ['First', 'Second']:
+            Entry.objects.create(
+                report=report, source=self.types, kind=Entry.Types.BARS, title=title,
+                attrs={'categories': 'type', 'values': ['count']},
+            )
+        url = reverse('report-data', kwargs={'slug': report.slug})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        data_queries = [query for query in context.captured_queries if 'example_person' in query['sql']]
+        self.assertEqual(len(data_queries), 1)
+        self.assertEqual(response['X-Reportcraft-Saved-Fetches'], '1')
+        first, second = response.json()['sections'][0]['content']
+        self.assertEqual(first['data'], second['data'])
+
+        report.entries.filter(title='Second').delete()
+        cache.clear()
+        self.assertEqual(self.client.get(url)['X-Reportcraft-Saved-Fetches'], '0')
+
+    def test_conditional_requests(self):
+        report = Report.objects.create(slug='etag', title='ETag', cache_control='private, max-age=60')
+        Entry.objects.create(
+            report=report, source=self.types, kind=Entry.Types.BARS, title='Types',
+            attrs={'categories': 'type', 'values': ['count']},
+        )
+        url = reverse('report-data', kwargs={'slug': report.slug})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+        self.assertIn('Accept', response['Vary'])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in context.captured_queries if 'example_person' in query['sql']])
+        self.assertEqual(self.client.get(url, {'type': 'user'}, headers={'If-None-Match': etag}).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Person.objects.filter(type='user').first().delete()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        url = reverse('source-data', kwargs={'pk': self.people.pk})
+        response = self.client.get(url)
+        response.close()
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        csv_url = reverse('format-source-data', kwargs={'pk': self.people.pk, 'format': 'csv'})
+        response = self.client.get(csv_url, headers={'If-None-Match': response['ETag']})
+        response.close()
+        self.assertEqual(response.status_code, 200)
+
+    def test_warm_command(self):
+        report = Report.objects.create(slug='warm', title='Warm', section='people')
+        Entry.objects.create(
+            report=report, source=self.types, kind=Entry.Types.BARS, title='Types',
+            attrs={'categories': 'type', 'values': ['count']},
+        )
+        url = reverse('report-data', kwargs={'slug': report.slug})
+        with mock.patch.object(caching, 'RECORD_ACCESS', 2):
+            for filters in [{'type': 'user'}, {'type': 'user'}, {'type': 'admin'}, {'type': 'guest'}]:
+                self.client.get(url, filters)
+            self.assertEqual(caching.get_top_filters(report.slug), [{'type': 'user'}, {'type': 'admin'}])
+            recorded = cache.get(caching.ACCESS_KEY.format(report.slug))
+            cache.clear()
+            cache.set(caching.ACCESS_KEY.format(report.slug), recorded)
+
+            out = io.StringIO()
+            call_command('reportcraft_warm', section='people', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        for filters in [{}, {'type': 'user'}, {'type': 'admin'}]:
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url, filters)
+            self.assertFalse([query for query in context.captured_queries if 'example_person' in query['sql']])
+
+
+class ProjectionTestCase(DataTestCase):
+    def test_entry_fields(self):
+        entry = Entry(kind=Entry.Types.BARS, attrs={'categories': 'type', 'values': ['count'], 'sort_by': 'avg_age'})
+        self.assertEqual(entry.get_fields(), ['avg_age', 'count', 'type'])
+        entry = Entry(kind=Entry.Types.PLOT, attrs={'x_value': 'age', 'groups': [{'type': 'line', 'y': 'count'}]})
+        self.assertEqual(entry.get_fields(), ['age', 'count'])
+
+    def test_projection(self):
+        data = self.people.get_source_data(fields=['first_name'])
+        self.assertEqual(set(data[0].keys()), {'first_name', 'age'})  # age is required for ordering
+        data = self.people.get_source_data(fields=['first_name'], filters={'type': 'user'})
+        self.assertEqual(set(data[0].keys()), {'first_name', 'age', 'type'})
+
+        data = self.types.get_source_data(fields=['count'])
+        self.assertEqual(set(data[0].keys()), {'type', 'count'})
+        self.assertEqual(data, [{'type': row['type'], 'count': row['count']} for row in self.types.get_source_data()])
+
+    def test_multi_valued_projection(self):
+        institution = Institution.objects.first()
+        institution.subjects.add(Subject.objects.create(name='Physics'), Subject.objects.create(name='Biology'))
+        source = create_source('Institutions', 'example.Institution', [
+            ('name', '', {}),
+            ('subject', 'Subjects.Name', {}),
+        ])
+        self.assertEqual(source.get_plan().multi_valued, {'subject'})
+        self.assertEqual(len(source.get_source_data()), 4)
+        self.assertEqual(source.get_source_data(fields=['name']), source.get_source_data())
+
+
+class PushDownTestCase(DataTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.report = Report.objects.create(slug='test', title='Test')
+
+    def test_list_order_limit(self):
+        entry = Entry.objects.create(
+            report=self.report, source=self.people, kind=Entry.Types.LIST,
+            attrs={'columns': ['first_name', 'age'], 'order_by': 'age', 'order_desc': False, 'limit': 3}
+        )
+        with CaptureQueriesContext(connection) as context:
+            info = entry.generate()
+        self.assertIn('LIMIT 3', context.captured_queries[-1]['sql'])
+        expected = sorted(self.people.get_source_data(), key=lambda x: x['age'])[:3]
+        self.assertEqual(info['data'][0][1:], [[row['first_name'], row['age']] for row in expected])
+
+    def test_bars_order_limit(self):
+        entry = Entry.objects.create(
+            report=self.report, source=self.types, kind=Entry.Types.BARS,
+            attrs={'categories': 'type', 'values': ['count'], 'sort_by': 'avg_age', 'sort_desc': True, 'limit': 2}
+        )
+        info = entry.generate()
+        expected = sorted(self.types.get_source_data(), key=lambda x: x['avg_age'], reverse=True)[:2]
+        self.assertEqual(
+            info['data'], [{'Type': row['type'], 'Count': row['count'], 'Avg Age': row['avg_age']} for row in expected]
+        )
+
+    def test_pie_totals(self):
+        entry = Entry.objects.create(
+            report=self.report, source=self.people, kind=Entry.Types.PIE, attrs={'label': 'type', 'value': 'age'}
+        )
+        self.assertTrue(self.people.get_plan().can_aggregate('type', 'age'))
+        self.assertFalse(self.types.get_plan().can_aggregate('type', 'count'))
+        with CaptureQueriesContext(connection) as context:
+            info = entry.generate(filters={'age__gt': 25})
+        self.assertIn('GROUP BY', context.captured_queries[-1]['sql'])
+
+        with mock.patch.object(SourcePlan, 'can_aggregate', return_value=False):
+            expected = entry.generate(filters={'age__gt': 25})
+        self.assertEqual(info.pop('data'), expected.pop('data'))
+        self.assertEqual(info, expected)
+
+    def test_histogram_bins(self):
+        entry = Entry.objects.create(
+            report=self.report, source=self.people, kind=Entry.Types.HISTOGRAM,
+            attrs={'values': 'age', 'group_by': 'type', 'binning': 'manual', 'bins': 4, 'prebinned': True},
+        )
+        with CaptureQueriesContext(connection) as context:
+            info = entry.generate()
+        self.assertIn('GROUP BY', context.captured_queries[-1]['sql'])
+        self.assertTrue(info['binned'])
+        self.assertEqual(len(info['bins']), 5)
+        self.assertEqual(sum(sum(series['counts']) for series in info['data']), Person.objects.count())
+
+        with mock.patch.object(SourcePlan, 'can_aggregate', return_value=False):
+            expected = entry.generate()
+        for edge, expected_edge in zip(info.pop('bins'), expected.pop('bins')):
+            self.assertAlmostEqual(edge, expected_edge)
+        self.assertCountEqual(info.pop('data'), expected.pop('data'))
+        self.assertEqual(info, expected)
+
+    def test_histogram_auto_bins(self):
+        entry = Entry.objects.create(
+            report=self.report, source=self.people, kind=Entry.Types.HISTOGRAM,
+            attrs={'values': 'age', 'group_by': 'type', 'binning': 'auto', 'prebinned': True},
+        )
+        # the same rule picks the bins in the database and in Python, also when all values are equal
+        for filters in [{}, {'age': 23}]:
+            with CaptureQueriesContext(connection) as context:
+                info = entry.generate(filters=filters)
+            self.assertIn('GROUP BY', context.captured_queries[-1]['sql'])
+            with mock.patch.object(SourcePlan, 'can_aggregate', return_value=False):
+                expected = entry.generate(filters=filters)
+            self.assertEqual(len(info['bins']), len(expected['bins']))
+            for edge, expected_edge in zip(info.pop('bins'), expected.pop('bins')):
+                self.assertAlmostEqual(edge, expected_edge)
+            self.assertCountEqual(info.pop('data'), expected.pop('data'))
+            self.assertEqual(info, expected)
+        self.assertEqual(entry.generate(filters={'age': 23})['data'], [{'group': 'user', 'counts': [1]}])
+
+    def test_pivot_table(self):
+        entry = Entry.objects.create(
+            report=self.report, source=self.people, kind=Entry.Types.TABLE,
+            attrs={'rows': ['type'], 'columns': 'institution_name', 'values': 'age', 'total_column': True},
+        )
+        with CaptureQueriesContext(connection) as context:
+            info = entry.generate()
+        self.assertIn('GROUP BY', context.captured_queries[-1]['sql'])
+        header, *rows = info['data'][0]
+        self.assertEqual(header, ['Institution Name', 'Institution 0', 'Institution 1', 'Institution 2', 'All'])
+        totals = Person.objects.values('type').annotate(total=Sum('age'))
+        self.assertEqual({row[0]: row[-1] for row in rows}, {item['type']: item['total'] for item in totals})
+        for row in rows:
+            self.assertEqual(row[-1], sum(row[1:-1]))
+
+        # each cell combines four people, which are also summed and kept in the source order in Python
+        with mock.patch.object(SourcePlan, 'can_aggregate', return_value=False):
+            expected = entry.generate()
+        self.assertEqual(info, expected)
+        self.assertEqual([row[0] for row in rows], ['guest', 'user', 'admin'])
+
+
+class DatasetTestCase(DataTestCase):
+    def test_source_dataset(self):
+        for source in [self.people, self.types]:
+            dataset = source.get_dataset()
+            self.assertEqual(dataset.to_records(labelled=False), source.get_source_data())
+            self.assertEqual(len(dataset), len(source.get_source_data()))
+        dataset = self.people.get_dataset(fields=['first_name'], filters={'type': 'user'})
+        self.assertEqual(set(dataset.names), {'first_name', 'age', 'type'})
+
+    def test_dataset_operations(self):
+        data = [{'name': 'a', 'x': 2, 'y': 1.5}, {'name': 'b', 'x': 1}, {'name': None, 'x': 2, 'y': 0.5}]
+        dataset = Dataset.from_records(data, labels={'x': 'X'})
+        self.assertEqual([item['name'] for item in dataset.sort('x', descending=True).to_records()], ['a', None, 'b'])
+        self.assertEqual([item['name'] for item in dataset.sort('name').to_records()], [None, 'a', 'b'])
+        self.assertEqual(dataset.filter('x', lambda x: x > 1).head(1).to_records(), [{'name': 'a', 'X': 2, 'y': 1.5}])
+        self.assertEqual([item['Value'] for item in dataset.select(['name']).melt(['x']).to_records()], [0, 0, 0])
+        self.assertEqual(dataset.head(1).melt(['x', 'y']).to_records(), [
+            {'name': 'a', 'Value': 2, 'Variable': 'X'}, {'name': 'a', 'Value': 1.5, 'Variable': 'y'}
+        ])
+
+
+class SnapshotTestCase(DataTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ids = create_source('Person IDs', 'example.Person', [
+            ('id', '', {'ordering': 1}),
+            ('first_name', '', {}),
+            ('type', '', {}),
+        ], snapshot_ttl=3600, incremental_field='id', snapshot_filters=[{'type': 'user'}])
+
+    def test_snapshot_data(self):
+        self.assertIsNone(self.ids.get_snapshot())
+        call_command('reportcraft_refresh', stdout=io.StringIO())
+        self.assertEqual(self.ids.snapshots.count(), 2)
+        self.assertEqual(self.ids.get_snapshot({'type': 'user'}).size, 4)
+
+        expected = self.ids.get_source_data(order_by=['-first_name'], limit=5)
+        with CaptureQueriesContext(connection) as context:
+            data = self.ids.get_data(order_by=['-first_name'], limit=5)
+        self.assertFalse([query for query in context.captured_queries if 'example_person' in query['sql']])
+        self.assertEqual(data, expected)
+
+    def test_typed_snapshot_filters(self):
+        source = create_source('Ages', 'example.Person', [
+            ('first_name', '', {}), ('age', '', {}),
+        ], snapshot_ttl=3600, snapshot_filters=[{'age': 23}])
+        call_command('reportcraft_refresh', stdout=io.StringIO())
+        self.assertIsNotNone(source.get_snapshot({'age': '23'}))
+
+        url = reverse('source-data', kwargs={'pk': source.pk})
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(url, {'age': '23', 'layout': 'columnar'}).json()
+        self.assertFalse([query for query in context.captured_queries if 'example_person' in query['sql']])
+        self.assertEqual(data['values'], [['First1'], [23]])
+
+    def test_incremental_refresh(self):
+        self.ids.refresh_snapshot()
+        person = Person.objects.create(
+            first_name='Newest', last_name='Person', age=30, type='user', institution=Institution.objects.first()
+        )
+        with CaptureQueriesContext(connection) as context:
+            snapshot = self.ids.refresh_snapshot()
+        self.assertIn('"id" >', ''.join(query['sql'] for query in context.captured_queries))
+        self.assertEqual(snapshot.marker, person.pk)
+        self.assertEqual(snapshot.get_data(), self.ids.get_source_data())
+
+    def test_incremental_datetime_refresh(self):
+        source = create_source('People Created', 'example.Person', [
+            ('created', '', {'ordering': 1}),
+            ('first_name', '', {}),
+        ], snapshot_ttl=3600, incremental_field='created')
+        Person.objects.filter(first_name='First11').update(
+            created=datetime(2030, 1, 1, 12, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        )
+        source.refresh_snapshot()
+        snapshot = source.refresh_snapshot()
+        self.assertEqual(snapshot.size, 12)
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.marker, '2030-01-01T12:00:00.123456+00:00')
+        self.assertEqual(source.refresh_snapshot().get_data(), source.get_source_data())
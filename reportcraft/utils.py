@@ -1,28 +1,32 @@
 from __future__ import annotations
 
 import csv
-import hashlib
-import io
+import itertools
+import json
 import re
 import threading
+import warnings
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import defaultdict
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
 from enum import Enum
-from functools import wraps, reduce
+from functools import reduce, lru_cache
 from importlib import import_module
 from inspect import getframeinfo, stack
 from io import StringIO
 from operator import or_
-from typing import Any, Sequence, Iterable
+from typing import Any, Sequence, Iterable, Iterator, Callable
 
 import pyparsing as pp
 import yaml
 from django.apps import apps
 from django.conf import settings
 from django.core import serializers
-from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
 from django.core.management import call_command
-from django.db import models
+from django.db import models, connection, connections
 from django.db.models import Count, Avg, Sum, Max, Min, F, Value as V, Q
 from django.db.models.functions import (
     Greatest, Least, Concat, Abs, Ceil, Floor, Exp, Ln, Log, Power, Sqrt, Sin, Cos, Tan, ASin, ACos, ATan,
@@ -30,10 +34,15 @@ from django.db.models.functions import (
     ExtractYear, ExtractMonth, ExtractDay, ExtractHour, ExtractMinute, ExtractSecond, ExtractWeekDay, ExtractWeek,
     JSONArray, ExtractQuarter,
 )
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from pyparsing.exceptions import ParseException
 
 from . import countries
+from .encoders import ExactJSONEncoder, get_json_serializer
+from .caching import (  # noqa: F401
+    CACHE_TIMEOUT, CACHE_DURATION, RenderMemo, render_context, get_render_memo, canonical, make_cache_key,
+    cached_model_method
+)
 from .functions import DisplayName, Hours, Minutes, ShiftStart, ShiftEnd, Interval, CumSum, CumCount
 
 FIELD_TYPES = {
@@ -137,6 +146,36 @@ def get_histogram_points(data: list[float], bins: Any = None) -> list[dict]:
     return [{'x': float(x), 'y': float(y)} for x, y in zip(centers, hist)]
 
 
+# "auto" uses Sturges' rule, the rule used when binning in the database, see DataSource.get_histogram
+BINNING_METHODS = {'freedman-diaconis': 'fd', 'scott': 'scott', 'sturges': 'sturges', 'auto': 'sturges'}
+
+
+def get_histogram_bins(values: Iterable, groups: Iterable = None, bins: Any = None) -> tuple[list[float], dict]:
+    """
+    Bin values into a histogram with shared bin edges for all groups. Missing and non-numeric values are ignored.
+    :param values: an iterable of numeric values
+    :param groups: an optional iterable of group values matching the values, all values form one group if None
+    :param bins: number of bins or the name of a binning method, see BINNING_METHODS
+    :return: a tuple of the bin edges and a dictionary mapping each group to the counts in each bin
+    """
+    import numpy as np
+    groups = itertools.repeat(None) if groups is None else groups
+    pairs = [(group, value) for value, group in zip(values, groups) if isinstance(value, (int, float, Decimal))]
+    if not pairs:
+        return [], {}
+
+    group_values, data = zip(*pairs)
+    data = np.asarray(data, dtype=float)
+    bins = int(bins) if str(bins).isdigit() else BINNING_METHODS.get(bins, 'sturges')
+    edges = np.histogram_bin_edges(data, bins=bins)
+    group_values = np.asarray(group_values, dtype=object)
+    counts = {
+        group: np.histogram(data[group_values == group], bins=edges)[0].tolist()
+        for group in dict.fromkeys(group_values.tolist())
+    }
+    return edges.tolist(), counts
+
+
 class Parser:
     @staticmethod
     def parse_float(tokens):
@@ -458,6 +497,118 @@ class FilterParser:
             return Q()  # Return an empty Q object if parsing fails and silent mode is on
 
 
+# Shared parser instances, the grammars are expensive to build so they are created once and reused. Packrat
+# parsing is not enabled, it is global to pyparsing and would affect every other user of it in the process. Parsed
+# results are cached by text instead.
+PARSER_CACHE_SIZE = getattr(settings, 'REPORTCRAFT_PARSER_CACHE_SIZE', 1024)
+EXPRESSION_PARSER = ExpressionParser()
+FILTER_PARSER = FilterParser()
+_parser_lock = threading.Lock()
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_expression(text: str):
+    """
+    Parse an expression string into a Django expression using the shared parser. Results are cached by expression
+    text and shared between callers, so they must be treated as immutable.
+    :param text: The expression string to parse
+    :return: A Django expression suitable for use in a QuerySet
+    """
+    with _parser_lock:
+        return EXPRESSION_PARSER.parse(text)
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_filters(text: str, silent: bool = False) -> Q:
+    """
+    Parse a filter string into a Q object using the shared parser. Results are cached by filter text and shared
+    between callers, so they must be treated as immutable.
+    :param text: The filter string to parse
+    :param silent: If True, return an empty Q object instead of raising a ValueError for invalid filters
+    :return: A Django Q object
+    """
+    with _parser_lock:
+        return FILTER_PARSER.parse(text, silent=silent)
+
+
+def get_referenced_paths(expression: Any) -> set[str]:
+    """
+    Find the full lookup paths referenced by a Django expression or Q object, e.g. 'journal__title' for
+    F('journal__title').
+    :param expression: A Django expression, Q object or value
+    :return: A set of lookup paths
+    """
+    if isinstance(expression, F):
+        return {expression.name}
+    elif isinstance(expression, Q):
+        paths = set()
+        for child in expression.children:
+            if isinstance(child, Q):
+                paths |= get_referenced_paths(child)
+            else:
+                lookup, value = child
+                paths.add(lookup)
+                paths |= get_referenced_paths(value)
+        return paths
+    elif hasattr(expression, 'get_source_expressions'):
+        return set().union(*(
+            get_referenced_paths(sub_expression) for sub_expression in expression.get_source_expressions()
+            if sub_expression is not None
+        ))
+    return set()
+
+
+def get_referenced_fields(expression: Any) -> set[str]:
+    """
+    Find the names of the fields referenced by a Django expression or Q object. Only the first part of
+    related lookups is returned, e.g. 'journal' for F('journal__title').
+    :param expression: A Django expression, Q object or value
+    :return: A set of field names
+    """
+    return {path.split('__')[0] for path in get_referenced_paths(expression)}
+
+
+def get_related_models(model: type[models.Model], path: str) -> set[type[models.Model]]:
+    """
+    Find the models reached by following the relations of a lookup path from a model. The path is followed until
+    a part which is not a relation, such as a plain field, a transform or a lookup.
+    :param model: The model to start from
+    :param path: A lookup path, e.g. 'journal__publisher__name'
+    :return: A set of related models
+    """
+    related = set()
+    for part in path.split('__'):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation or field.related_model is None:
+            break
+        model = field.related_model
+        related.add(model)
+    return related
+
+
+def is_multi_valued(model: type[models.Model], path: str) -> bool:
+    """
+    Check if a lookup path from a model follows a reverse foreign key or a many-to-many relation, so that a query
+    selecting it can return several rows for each row of the model.
+    :param model: The model to start from
+    :param path: A lookup path, e.g. 'subjects__name'
+    """
+    for part in path.split('__'):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation or field.related_model is None:
+            break
+        if field.one_to_many or field.many_to_many:
+            return True
+        model = field.related_model
+    return False
+
+
 def regroup_data(
         data: list[dict],
         x_axis: str = '',
@@ -528,37 +679,76 @@ def regroup_data(
     return data_list
 
 
-def _key_value(item, key_field):
-    value = item.get(key_field)
-    return str(value)
-
-
-def _make_key(item, keys):
-    return tuple(_key_value(item, k) for k in keys)
+def natural_key(value: Any) -> tuple:
+    """
+    Sort key for the natural ordering of values of mixed types. Missing values sort first, followed by numbers in
+    numeric order, strings and then any other values.
+    :param value: the value to create a key for
+    """
+    if value is None:
+        return 0, 0
+    elif isinstance(value, (int, float, Decimal)):
+        return 1, value
+    elif isinstance(value, str):
+        return 2, value
+    return 3, value
 
 
 def merge_data(
-        data: list[dict],
+        data: Iterable[dict],
         unique: list[str],
+        sort: bool = True,
 ) -> list[dict]:
     """
-    Combine data from multiple models into neat key-value pairs .if multiple entries exist for the same unique set,
-    they are merged into a single entry with later duplicated values taking precedence.
+    Combine data from multiple models into neat key-value pairs. If multiple entries exist for the same unique set,
+    they are merged into a single entry with later duplicated values taking precedence. The entries of the data are
+    not modified.
 
-    :param data: list of dictionaries
+    :param data: iterable of dictionaries
     :param unique: Names of unique axes
+    :param sort: Sort the merged entries in natural order of their unique values, otherwise the order in which
+        unique sets first appear is kept
     """
 
-    # make a dictionary mapping unique values to unique entries, these will be populated later
-    # convert to tuple of strings to make it hashable
-    unique_keys = sorted({_make_key(item, unique) for item in data})
-    raw_data = {key: {} for key in unique_keys}
-    # first pass to populate raw_data
+    if len(unique) == 1:
+        field = unique[0]
+        get_key = lambda item: item.get(field)
+        sort_key = natural_key
+    else:
+        get_key = lambda item: tuple(item.get(k) for k in unique)
+        sort_key = lambda key: tuple(natural_key(value) for value in key)
+
+    merged = {}
     for item in data:
-        key = _make_key(item, unique)
-        raw_data[key].update(item)
+        key = get_key(item)
+        entry = merged.get(key)
+        if entry is None:
+            merged[key] = dict(item)
+        else:
+            entry.update(item)
+
+    if sort:
+        try:
+            keys = sorted(merged)
+        except TypeError:
+            # missing values or mixed types
+            keys = sorted(merged, key=sort_key)
+        return [merged[key] for key in keys]
+    return list(merged.values())
 
-    return list(raw_data.values())
+
+def sort_data(data: list[dict], order_by: list[str] = None, limit: int = None) -> list[dict]:
+    """
+    Sort a list of dictionaries in place by several fields in natural order, see natural_key.
+
+    :param data: list of dictionaries
+    :param order_by: names of fields to sort by, prefixed with '-' for descending order
+    :param limit: maximum number of items to return
+    """
+    for name in reversed(order_by or []):
+        field = name.lstrip('-')
+        data.sort(key=lambda item: natural_key(item.get(field)), reverse=name.startswith('-'))
+    return data[:limit] if limit else data
 
 
 class ValueType(Enum):
@@ -646,61 +836,52 @@ def split_data(
     return grouped_data
 
 
-CACHE_TIMEOUT = 86400
+_query_executor = None
+_query_workers = 0
+_query_executor_lock = threading.Lock()
 
 
-def cached_model_method(duration: int = 30):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(self, *args, **kwargs):
-            # Generate a cache key using method name and arguments
-            key_data = {
-                'id': self.id,
-                'class': self.__class__.__name__,
-                'method': func.__name__,
-                'args': args,
-                'kwargs': kwargs
-            }
-            key_string = yaml.dump(key_data, sort_keys=True)
-            cache_key = f"cache:{hashlib.md5(key_string.encode()).hexdigest()}"
-            cache_expiry_key = f"{cache_key}:expiry"
-
-            try:
-                results = cache.get_many((cache_key, cache_expiry_key))
-                cached_result = results.get(cache_key)
-                now = datetime.now()
-                expiry = results.get(cache_expiry_key, now)
-                if cached_result is not None:
-                    if now - expiry > timedelta(seconds=duration):
-                        # Asynchronously replace cache value if it is about to expire,
-                        # next request will get the fresh value
-                        threading.Thread(
-                            target=_update_cache, args=(self, func, cache_key, args, kwargs, duration)
-                        ).start()
-                    return cached_result
-
-                # Compute and store the fresh result
-                return _update_cache(self, func, cache_key, args, kwargs, duration)
-            except Exception as e:
-                print(f"Cache error: {e}")
-                return func(self, *args, **kwargs)
-
-        return wrapper
-
-    return decorator
-
-
-def _update_cache(self, func, cache_key, args, kwargs, duration):
-    """Updates the cache value asynchronously."""
-    result = func(self, *args, **kwargs)
-    cache_expiry_key = f"{cache_key}:expiry"
-    cache.set_many(
-        {
-            cache_key: result,
-            cache_expiry_key: datetime.now() + timedelta(seconds=duration)
-        }, timeout=CACHE_TIMEOUT
-    )
-    return result
+def get_query_executor() -> ThreadPoolExecutor | None:
+    """
+    Get the shared thread pool used to run the per-model queries of a data source concurrently. The pool is
+    sized by the REPORTCRAFT_QUERY_WORKERS setting and parallel execution is disabled if it is less than 2. The pool
+    is replaced when the setting changes, e.g. with override_settings.
+    """
+    global _query_executor, _query_workers
+    workers = getattr(settings, 'REPORTCRAFT_QUERY_WORKERS', 0) or 0
+    if workers < 2:
+        return None
+    with _query_executor_lock:
+        if _query_executor is None or _query_workers != workers:
+            if _query_executor is not None:
+                _query_executor.shutdown(wait=False)
+            _query_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reportcraft-query')
+            _query_workers = workers
+    return _query_executor
+
+
+def _run_query(func: Callable) -> Any:
+    """
+    Run a query function in a worker thread and release the thread's database connections afterwards.
+    """
+    try:
+        return func()
+    finally:
+        connections.close_all()
+
+
+def run_queries(funcs: Sequence[Callable]) -> list:
+    """
+    Run a sequence of query functions and return their results in the same order. The functions are run
+    concurrently in the shared query pool if enabled, otherwise sequentially. Queries are always run sequentially
+    within a transaction since worker threads use their own connections and would not see uncommitted changes.
+    :param funcs: callables taking no arguments
+    """
+    executor = get_query_executor()
+    if executor is None or len(funcs) < 2 or connection.in_atomic_block:
+        return [func() for func in funcs]
+    futures = [executor.submit(_run_query, func) for func in funcs]
+    return [future.result() for future in futures]
 
 
 def epoch(dt: datetime = None) -> int:
@@ -834,26 +1015,145 @@ class MinMax:
         return f"Min: {self.min}, Max: {self.max}"
 
 
+def batched(iterable: Iterable, size: int) -> Iterator[tuple]:
+    """
+    Split an iterable into tuples of at most `size` items, like itertools.batched in Python 3.12+
+    :param iterable: the iterable to split
+    :param size: the maximum number of items per batch
+    """
+    iterator = iter(iterable)
+    while batch := tuple(itertools.islice(iterator, size)):
+        yield batch
+
+
+def keyset_filter(fields: Sequence[str], values: Sequence) -> Q:
+    """
+    Generate a filter selecting the rows which follow a row in the ascending order of several fields, with missing
+    values first, for keyset pagination.
+    :param fields: names of the ordering fields
+    :param values: values of the ordering fields in the last row
+    """
+    field, value = fields[0], values[0]
+    if value is None:
+        after, equal = Q(**{f'{field}__isnull': False}), Q(**{f'{field}__isnull': True})
+    else:
+        after, equal = Q(**{f'{field}__gt': value}), Q(**{field: value})
+    if len(fields) > 1:
+        return after | (equal & keyset_filter(fields[1:], values[1:]))
+    return after
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Encode a position within paginated data as an opaque cursor
+    :param position: JSON serializable dictionary describing the position
+    """
+    return urlsafe_b64encode(json.dumps(position, cls=ExactJSONEncoder).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decode a cursor generated by encode_cursor
+    :param cursor: the cursor
+    :raises ValueError: if the cursor is not valid
+    """
+    try:
+        position = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+
+class CsvStreamResponse(StreamingHttpResponse):
+    """
+    A streaming HTTP response class that writes an iterable of rows to CSV as it is consumed.
+
+    :param data: Data to be written. Should be an iterable of dicts.
+    :param labels: mapping of field names to column headers, in column order. Other fields are not written.
+    :param batch_size: number of rows to write per chunk of the response
+    """
+
+    def __init__(self, data: Iterable[dict], labels: dict[str, str], batch_size: int = 500, **kwargs):
+        kwargs.setdefault("content_type", "text/csv")
+        super().__init__(streaming_content=self.generate(data, labels, batch_size), **kwargs)
+
+    @staticmethod
+    def generate(data: Iterable[dict], labels: dict[str, str], batch_size: int) -> Iterator[str]:
+        stream = StringIO()
+        writer = csv.DictWriter(stream, fieldnames=list(labels), extrasaction='ignore')
+        writer.writerow(labels)
+        yield stream.getvalue()
+        for batch in batched(data, batch_size):
+            stream.seek(0)
+            stream.truncate()
+            writer.writerows(batch)
+            yield stream.getvalue()
+
+
 class CsvResponse(HttpResponse):
     """
     An HTTP response class that consumes data to be serialized to CSV.
 
-    :param data: Data to be dumped into csv. Should be alist of dicts.
+    Deprecated, use CsvStreamResponse, which does not build the whole file in memory.
+
+    :param data: Data to be dumped into csv. Should be an iterable of dicts.
+    :param headers: names of the fields to write, also used as column headers
     """
 
-    def __init__(self, data: list[dict], headers: list[str], **kwargs):
+    def __init__(self, data: Iterable[dict], headers: list[str], **kwargs):
+        warnings.warn(
+            "CsvResponse is deprecated, use CsvStreamResponse instead", DeprecationWarning, stacklevel=2
+        )
         kwargs.setdefault("content_type", "text/csv")
-        content = ''
-        if data:
-            stream = io.StringIO()
-            writer = csv.DictWriter(stream, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(data)
-            content = stream.getvalue()
-            stream.close()
+        content = ''.join(CsvStreamResponse.generate(data, {name: name for name in headers}, 500))
         super().__init__(content=content, **kwargs)
 
 
+class JsonStreamResponse(StreamingHttpResponse):
+    """
+    A streaming HTTP response class that serializes an iterable of rows into a JSON array as it is consumed, using
+    the configured JSON serializer, see encoders.get_json_serializer.
+
+    :param data: Data to be serialized. Should be an iterable of JSON serializable items.
+    :param batch_size: number of items to serialize per chunk of the response
+    """
+
+    def __init__(self, data: Iterable, batch_size: int = 500, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(streaming_content=self.generate(data, batch_size), **kwargs)
+
+    @staticmethod
+    def generate(data: Iterable, batch_size: int) -> Iterator[bytes]:
+        serializer = get_json_serializer()
+        prefix = b'['
+        for batch in batched(data, batch_size):
+            yield prefix + serializer.dumps(list(batch))[1:-1]
+            prefix = b','
+        yield b'[]' if prefix == b'[' else b']'
+
+
+class NdjsonStreamResponse(StreamingHttpResponse):
+    """
+    A streaming HTTP response class that serializes an iterable of rows as newline-delimited JSON, one row per line,
+    as it is consumed.
+
+    :param data: Data to be serialized. Should be an iterable of JSON serializable items.
+    :param batch_size: number of items to serialize per chunk of the response
+    """
+
+    def __init__(self, data: Iterable, batch_size: int = 500, **kwargs):
+        kwargs.setdefault("content_type", "application/x-ndjson")
+        super().__init__(streaming_content=self.generate(data, batch_size), **kwargs)
+
+    @staticmethod
+    def generate(data: Iterable, batch_size: int) -> Iterator[bytes]:
+        serializer = get_json_serializer()
+        for batch in batched(data, batch_size):
+            yield b''.join(serializer.dumps(item) + b'\n' for item in batch)
+
+
 def get_map_choices():
     """
     Get grouped list of choices for continent, subregions and countries
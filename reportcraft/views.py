@@ -1,11 +1,16 @@
+import hashlib
 import json
+import logging
+import time
 from collections import defaultdict
+from typing import Any, Iterator
 
 from django.conf import settings
-from django.http import JsonResponse, Http404, HttpResponseRedirect
+from django.http import JsonResponse, Http404, HttpResponseRedirect, HttpResponseBadRequest
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.utils.http import urlencode
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
 from django.utils.module_loading import import_string
 from django.utils.safestring import mark_safe
 from django.views import View
@@ -13,13 +18,86 @@ from django.views.generic import DetailView, edit, ListView, TemplateView
 from crisp_modals.views import ModalUpdateView, ModalCreateView, ModalDeleteView, ModalConfirmView
 from itemlist.views import ItemListView
 
-from . import models, forms
-from .utils import CsvResponse
+from . import caching, models, forms, plans
+from .datasets import COLUMNAR_PARAM, COLUMNAR_MEDIA_TYPE, Dataset, is_records, to_columnar
+from .encoders import JsonDataResponse
+from .utils import CsvStreamResponse, JsonStreamResponse, NdjsonStreamResponse, render_context
 
+logger = logging.getLogger('reportcraft')
+
+SAVED_FETCHES_HEADER = 'X-Reportcraft-Saved-Fetches'
+CACHE_CONTROL = getattr(settings, 'REPORTCRAFT_CACHE_CONTROL', 'private, no-cache')
+PAGE_SIZE = getattr(settings, 'REPORTCRAFT_PAGE_SIZE', 1000)
+MAX_PAGE_SIZE = getattr(settings, 'REPORTCRAFT_MAX_PAGE_SIZE', 10000)
+CURSOR_PARAM = 'cursor'
+PAGE_SIZE_PARAM = 'page_size'
 VIEW_MIXINS = [import_string(mixin) for mixin in settings.REPORTCRAFT_MIXINS.get('VIEW',[])]
 EDIT_MIXINS = [import_string(mixin) for mixin in settings.REPORTCRAFT_MIXINS.get('EDIT', [])]
 
 
+def wants_columnar(request) -> bool:
+    """
+    Check if the client asked for data in the columnar wire format, either through the query parameter or
+    the Accept header.
+    :param request: the HTTP request
+    """
+    return (
+        request.GET.get(COLUMNAR_PARAM) == 'columnar' or COLUMNAR_MEDIA_TYPE in request.headers.get('Accept', '')
+    )
+
+
+def get_filters(request) -> dict:
+    """
+    Get the dynamic filters from the query parameters of a request
+    :param request: the HTTP request
+    """
+    return {
+        key: value for key, value in request.GET.items() if key not in (COLUMNAR_PARAM, CURSOR_PARAM, PAGE_SIZE_PARAM)
+    }
+
+
+def get_validators(request, definitions: list, sources: list, *extra: Any) -> tuple[str, float]:
+    """
+    Compute the ETag and last modification time of data served for a request, without generating the data. Both
+    change when any of the definitions change, when the definition or data version of any of the sources change, and
+    after each cache duration of the sources, since changes made without model signals are only picked up when the
+    cached results are refreshed.
+    :param request: the HTTP request
+    :param definitions: the model instances defining the data, with a modified field
+    :param sources: the data sources providing the data
+    :param extra: other values distinguishing the responses, such as the format
+    :return: a tuple of the quoted ETag and the last modification time as a POSIX timestamp
+    """
+    now = time.time()
+    parts = [(type(item).__name__, item.pk, item.modified.timestamp()) for item in definitions]
+    times = [part[-1] for part in parts]
+    for source in {source.pk: source for source in sources}.values():
+        version = source.get_cache_version()
+        duration = source.get_cache_duration() or 1
+        period = int(now // duration)
+        parts.append((source.pk, version, period))
+        times += [plans.get_version_time(version), period * duration]
+    parts.append((get_filters(request), wants_columnar(request), *extra))
+    digest = hashlib.blake2b(repr(caching.canonical(parts)).encode(), digest_size=16).hexdigest()
+    return quote_etag(digest), max(times, default=now)
+
+
+def set_validators(response, etag: str, last_modified: float, cache_control: str):
+    """
+    Set the validator and caching headers of a data response
+    :param response: the response
+    :param etag: the quoted ETag
+    :param last_modified: the last modification time as a POSIX timestamp
+    :param cache_control: the Cache-Control header
+    """
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
 class ReportView(DetailView):
     template_name = 'reportcraft/report.html'
     model = models.Report
@@ -80,11 +158,14 @@ class DataView(View):
         if not report:
             raise Http404('Report not found')
 
-        filters = dict(self.request.GET.items())
+        filters = get_filters(self.request)
+        with render_context() as memo:
+            content = [block.generate(filters=filters) for block in report.entries.select_related('source')]
+        self.saved_fetches = memo.hits
         section = {
             'style': f"row",
             'theme': report.theme,
-            'content': [block.generate(filters=filters) for block in report.entries.all()],
+            'content': content,
             'notes': report.notes
         }
         return {
@@ -93,9 +174,41 @@ class DataView(View):
             'sections': [section],
         }
 
+    def get_validators(self, *args, slug='', **kwargs) -> tuple[str, float, str] | None:
+        """
+        Compute the ETag, last modification time and Cache-Control header of the report data without generating it
+        :param args: positional arguments
+        :param slug: slug of the report
+        :param kwargs: keyword arguments
+        :return: a tuple of the ETag, the last modification time and the Cache-Control header, or None if the report
+            does not exist
+        """
+        report = self.get_queryset().filter(slug=slug).first()
+        if not report:
+            return None
+        entries = list(report.entries.select_related('source'))
+        etag, last_modified = get_validators(
+            self.request, [report, *entries], [entry.source for entry in entries if entry.source]
+        )
+        return etag, last_modified, report.cache_control or CACHE_CONTROL
+
     def get(self, request, *args, **kwargs):
+        validators = self.get_validators(*args, **kwargs)
+        if validators is not None:
+            not_modified = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+            if not_modified is not None:
+                return set_validators(not_modified, *validators)
+
         info = self.get_report(*args, **kwargs)
-        return JsonResponse(info, safe=False)
+        caching.record_access(kwargs.get('slug', ''), get_filters(request))
+        if wants_columnar(request):
+            for section in info['sections']:
+                for entry in section['content']:
+                    if is_records(entry.get('data')):
+                        entry['data'] = to_columnar(entry['data'])
+        response = JsonDataResponse(info)
+        response[SAVED_FETCHES_HEADER] = getattr(self, 'saved_fetches', 0)
+        return set_validators(response, *validators) if validators else response
 
 
 class MainReportView(*VIEW_MIXINS, ReportView):
@@ -115,16 +228,103 @@ class SourceData(*VIEW_MIXINS, View):
         if not source:
             raise Http404('Source not found')
 
-        params = dict(request.GET.items())
-        try:
-            data = source.get_data(filters=params)
-        except Exception:
-            data = []
+        params = get_filters(request)
         content_type = self.kwargs.get('format', 'json').lower()
+        etag, last_modified = get_validators(request, [source], [source], content_type)
+        validators = (etag, last_modified, CACHE_CONTROL)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return set_validators(not_modified, *validators)
+
         if content_type == 'csv':
-            return CsvResponse(data, headers=source.get_labels().keys())
+            response = CsvStreamResponse(self.get_rows(source, filters=params), labels=source.get_labels())
+        elif content_type == 'ndjson':
+            response = NdjsonStreamResponse(self.get_rows(source, filters=params))
+        elif wants_columnar(request):
+            response = JsonDataResponse(self.get_dataset(source, filters=params).to_columnar(labelled=False))
+        else:
+            response = JsonStreamResponse(self.get_rows(source, filters=params))
+        return set_validators(response, *validators)
+
+    @staticmethod
+    def get_rows(source, **kwargs) -> Iterator[dict]:
+        """
+        Stream the rows of the data source, returning no rows if the data cannot be generated. Rows are read from
+        the database while the response is sent, so errors after the first row can no longer change the response.
+        They are logged and abort the response, which clients see as an incomplete transfer.
+        :param source: the data source
+        :param kwargs: keyword arguments passed to DataSource.iter_data
+        """
+        rows = source.iter_data(**kwargs)
+        try:
+            first = next(rows, None)
+        except Exception:
+            return iter([])
+        return SourceData.stream_rows(source, first, rows) if first is not None else iter([])
+
+    @staticmethod
+    def stream_rows(source, first: dict, rows: Iterator[dict]) -> Iterator[dict]:
+        """
+        Yield the rows of a data source, logging errors raised while reading them
+        :param source: the data source
+        :param first: the first row
+        :param rows: the remaining rows
+        """
+        yield first
+        try:
+            yield from rows
+        except Exception:
+            logger.exception(f"Streaming the data of source {source.pk} failed after the first row")
+            raise
+
+    @staticmethod
+    def get_dataset(source, **kwargs) -> Dataset:
+        """
+        Fetch the data source as a columnar dataset, returning an empty dataset if the data cannot be generated.
+        :param source: the data source
+        :param kwargs: keyword arguments passed to DataSource.get_dataset
+        """
+        try:
+            return source.get_dataset(**kwargs)
+        except Exception:
+            return Dataset({})
+
+
+class SourcePages(*VIEW_MIXINS, View):
+    """
+    Serve the data of a data source one page at a time. Each page holds the rows and the URL of the next page, which
+    is null for the last page.
+    """
+    model = models.DataSource
+
+    def get(self, request, *args, **kwargs):
+        source = self.model.objects.filter(pk=kwargs.get('pk')).first()
+        if not source:
+            raise Http404('Source not found')
+
+        try:
+            size = min(max(int(request.GET.get(PAGE_SIZE_PARAM, PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid page size')
+
+        etag, last_modified = get_validators(request, [source], [source], request.GET.get(CURSOR_PARAM), size)
+        validators = (etag, last_modified, CACHE_CONTROL)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return set_validators(not_modified, *validators)
+
+        try:
+            rows, cursor = source.get_page(
+                filters=get_filters(request), cursor=request.GET.get(CURSOR_PARAM), size=size
+            )
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        if cursor:
+            query = {**request.GET.dict(), CURSOR_PARAM: cursor, PAGE_SIZE_PARAM: size}
+            next_url = request.build_absolute_uri(f'{request.path}?{urlencode(query)}')
         else:
-            return JsonResponse(data, safe=False)
+            next_url = None
+        return set_validators(JsonDataResponse({'results': rows, 'next': next_url}), *validators)
 
 
 class ReportIndexView(ItemListView):
@@ -330,6 +530,7 @@ def update_model_fields(data, view):
             position=i,
             modified=timezone.now(),
         )
+    plans.invalidate(view.object.source_id)
 
 
 class AddSourceModel(*EDIT_MIXINS, ModalCreateView):